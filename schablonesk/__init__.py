@@ -1,31 +1,158 @@
 import os
+from schablonesk.config import Config
 from schablonesk.scanner import Scanner
 from schablonesk.parser import Parser
 from schablonesk.environment import Environment
 from schablonesk.interpreter import Interpreter
-from schablonesk.template_exports import TemplateExports
+from schablonesk.compiler import Compiler
+from schablonesk.optimizer import Optimizer
+from schablonesk.template import CompiledTemplate, NamedTemplate, TemplateCache
+from schablonesk.snippet_cache import SnippetCache
+from schablonesk.template_exports import TemplateExports, TemplateIndex, find_template_file
+from schablonesk.disk_cache import DiskCache
+from schablonesk.version import VERSION
 
-
-VERSION = "0.2.3"
+# public API, also the classes re-exported from the submodules
+__all__ = [
+    "CodeGenerator",
+    "CompiledTemplate",
+    "Compiler",
+    "Config",
+    "DiskCache",
+    "Environment",
+    "Interpreter",
+    "NamedTemplate",
+    "Optimizer",
+    "Parser",
+    "Scanner",
+    "SnippetCache",
+    "TemplateCache",
+    "TemplateExports",
+    "TemplateIndex",
+    "VERSION",
+    "create_worker_pool",
+    "find_template_file"
+]
 
 
 class CodeGenerator(object):
 
     TEMPL_PATH = "SCHABLONESK_TEMPLATE_DIRS"
 
-    def __init__(self, search_paths=None):
+    def __init__(self, search_paths=None, compiled=False, cache_size=128, snippet_cache=None,
+                 cache_dir=None, share_exports=False, config=None, template_index=None,
+                 optimize=True):
         if search_paths is not None:
             self._search_paths = search_paths
         elif self.TEMPL_PATH in os.environ:
             self._search_paths = os.environ[self.TEMPL_PATH].split(os.pathsep)
         else:
             self._search_paths = [os.path.curdir]
+        self._config = (config if config is not None else Config.get()).copy()
+        # True creates an index of the search paths, an existing
+        # TemplateIndex can be shared between code generators
+        if template_index is True:
+            template_index = TemplateIndex(self._search_paths)
+        self._template_index = template_index or None
+        self._compiled = compiled
+        self._optimize = optimize
+        self._cache_size = cache_size
+        self._cache_dir = cache_dir
+        self._snippet_cache = snippet_cache
+        self._disk_cache = DiskCache(cache_dir, self._config) if cache_dir is not None else None
+        self._template_cache = TemplateCache(self._create_template, cache_size, self._config)
+        # Shared exports keep imported templates loaded across renders
+        self._template_exports = self._new_template_exports() if share_exports else None
 
     def generate_code(self, template_code, **params):
-        ast = Parser(Scanner().scan(template_code)).parse()
+        return self.compile(template_code).render(**params)
+
+    def generate_iter(self, template_code, **params):
+        return self.compile(template_code).stream(**params)
+
+    async def generate_code_async(self, template_code, **params):
+        return await self.compile(template_code).render_async(**params)
+
+    def generate_iter_async(self, template_code, **params):
+        return self.compile(template_code).stream_async(**params)
+
+    def render_many(self, jobs, workers=None):
+        # jobs are (template_name, params) pairs, results keep the job order
+        jobs = list(jobs)
+        if workers is None or workers <= 1 or len(jobs) <= 1:
+            return [self.load(template_name).render(**params) for template_name, params in jobs]
+        settings = self._get_worker_settings()
+        jobs = [(settings, template_name, params) for template_name, params in jobs]
+        with create_worker_pool(workers) as executor:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            return list(executor.map(_render_job, jobs, chunksize=chunksize))
+
+    def submit(self, executor, template_name, params):
+        # renders in a worker process of create_worker_pool, returns the future
+        return executor.submit(_render_job, (self._get_worker_settings(), template_name, params))
+
+    def compile(self, template_code):
+        return self._template_cache.get_template(template_code)
+
+    def load(self, template_name):
+        if self._template_index is not None:
+            template_path = self._template_index.find(template_name)
+        else:
+            template_path = find_template_file(self._search_paths, template_name)
+        if template_path is None:
+            raise Exception(f"Cannot load template file '{template_name}'")
+        with open(template_path, "r") as f:
+            template_code = f.read()
+        return NamedTemplate(self.compile(template_code), template_name)
+
+    def invalidate(self, changed_files):
+        # only shared exports outlive a render, parsed templates are cached
+        # by content and are therefore never stale
+        if self._template_exports is not None:
+            self._template_exports.invalidate(changed_files)
+        elif self._template_index is not None and changed_files:
+            self._template_index.refresh()
+
+    def create_template_exports(self):
+        if self._template_exports is not None:
+            return self._template_exports
+        return self._new_template_exports()
+
+    def _get_worker_settings(self):
+        snippet_cache_size = self._snippet_cache.max_size if self._snippet_cache is not None else None
+        return (tuple(self._search_paths), self._compiled, self._cache_size, self._cache_dir,
+                snippet_cache_size, self._config.key(), self._template_index is not None, self._optimize)
+
+    def _new_template_exports(self):
+        return TemplateExports(self._search_paths, self._template_cache, self._disk_cache, self._config,
+                               self._template_index)
+
+    def _create_template(self, template_code):
+        ast = Parser(Scanner(self._config).scan(template_code), self._config).parse()
+        if self._optimize:
+            ast = Optimizer().optimize(ast)
+        return CompiledTemplate(ast, self.create_template_exports, self._compiled, self._snippet_cache)
+
+
+def create_worker_pool(workers):
+    # imported here as most renders need no worker processes
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+_worker_code_generators = {}
 
-        env = Environment()
-        for name, value in params.items():
-            env.set_value(name, value)
 
-        return Interpreter(env, TemplateExports(self._search_paths)).eval(ast)
+def _render_job(job):
+    # Each worker process keeps a code generator per settings, so imported
+    # templates are loaded once and reused
+    settings, template_name, params = job
+    code_generator = _worker_code_generators.get(settings)
+    if code_generator is None:
+        search_paths, compiled, cache_size, cache_dir, snippet_cache_size, config_key, use_index, optimize = settings
+        snippet_cache = SnippetCache(snippet_cache_size) if snippet_cache_size is not None else None
+        code_generator = CodeGenerator(list(search_paths), compiled, cache_size, snippet_cache,
+                                       cache_dir, share_exports=True, config=Config(*config_key),
+                                       template_index=use_index, optimize=optimize)
+        _worker_code_generators[settings] = code_generator
+    return code_generator.load(template_name).render(**params)
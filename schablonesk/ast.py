@@ -1,9 +1,16 @@
+import operator
+from collections.abc import Mapping
+
+
 class Template(object):
 
+    __slots__ = ("usages", "snippets", "statements", "scope")
+
     def __init__(self, usages, snippets, statements):
         self.usages = usages
         self.snippets = snippets
         self.statements = statements
+        self.scope = None
 
     def accept(self, visitor):
         visitor.visit_template(self)
@@ -11,16 +18,18 @@ class Template(object):
 
 class Text(object):
 
-    def __init__(self, text_token):
-        self._token = text_token
+    __slots__ = ("token", "parts")
 
-    def get_token(self):
-        return self._token
+    def __init__(self, text_token, parts=None):
+        self.token = text_token
+        # literal strings and expressions embedded via $(...)
+        self.parts = parts if parts is not None else (text_token.lexeme,)
 
-    token = property(get_token)
+    def get_token(self):
+        return self.token
 
     def _get_content(self):
-        return self._token.lexeme
+        return self.token.lexeme
 
     content = property(_get_content)
 
@@ -30,6 +39,8 @@ class Text(object):
 
 class Block(object):
 
+    __slots__ = ("statements",)
+
     def __init__(self, statements):
         self.statements = statements
 
@@ -39,6 +50,8 @@ class Block(object):
 
 class CondBlock(object):
 
+    __slots__ = ("branches",)
+
     def __init__(self, branches):
         self.branches = branches
 
@@ -48,11 +61,14 @@ class CondBlock(object):
 
 class ForBlock(object):
 
+    __slots__ = ("item_ident", "list_expr", "statements", "filter_cond", "scope")
+
     def __init__(self, item_ident, list_expr, statements, filter_cond=None):
         self.item_ident = item_ident
         self.list_expr = list_expr
         self.statements = statements
         self.filter_cond = filter_cond
+        self.scope = None
 
     def accept(self, visitor):
         visitor.visit_for(self)
@@ -60,10 +76,14 @@ class ForBlock(object):
 
 class Snippet(object):
 
+    __slots__ = ("name", "params", "statements", "scope", "template_name", "__weakref__")
+
     def __init__(self, snippet_name, params, statements):
         self.name = snippet_name
         self.params = params
         self.statements = statements
+        self.scope = None
+        self.template_name = None  # set for snippets imported by TemplateExports
 
     def accept(self, visitor):
         visitor.visit_snippet(self)
@@ -71,10 +91,13 @@ class Snippet(object):
 
 class SnippetCall(object):
 
+    __slots__ = ("name", "args", "indent", "variables")
+
     def __init__(self, snippet_name, args, indent=None):
         self.name = snippet_name
         self.args = args
         self.indent = indent
+        self.variables = None
 
     def accept(self, visitor):
         visitor.visit_snippet_call(self)
@@ -82,9 +105,12 @@ class SnippetCall(object):
 
 class Assignment(object):
 
+    __slots__ = ("source", "target", "variable")
+
     def __init__(self, source, target):
         self.source = source
         self.target = target
+        self.variable = None
 
     def accept(self, visitor):
         visitor.visit_assignment(self)
@@ -92,6 +118,8 @@ class Assignment(object):
 
 class Call(object):
 
+    __slots__ = ("callee", "args")
+
     def __init__(self, callee, args):
         self.callee = callee
         self.args = args
@@ -102,6 +130,8 @@ class Call(object):
 
 class Use(object):
 
+    __slots__ = ("template_name", "names")
+
     def __init__(self, template_name, names):
         self.template_name = template_name
         self.names = names  # names and aliases
@@ -112,6 +142,8 @@ class Use(object):
 
 class SingleToken(object):
 
+    __slots__ = ("token",)
+
     def __init__(self, token):
         self.token = token
 
@@ -121,8 +153,11 @@ class SingleToken(object):
 
 class Identifier(SingleToken):
 
+    __slots__ = ("variables",)
+
     def __init__(self, identifier_token):
         SingleToken.__init__(self, identifier_token)
+        self.variables = None  # candidate variables set by the resolver
 
     def get_name(self):
         return self.token.lexeme
@@ -130,8 +165,11 @@ class Identifier(SingleToken):
 
 class SimpleValue(SingleToken):
 
+    __slots__ = ("value",)
+
     def __init__(self, token):
         SingleToken.__init__(self, token)
+        self.value = self.get_value()  # decoded once, literals are evaluated often
 
     def get_value(self):
         raise Exception("Not implemented")
@@ -139,6 +177,8 @@ class SimpleValue(SingleToken):
 
 class Bool(SimpleValue):
 
+    __slots__ = ()
+
     def __init__(self, bool_token):
         SimpleValue.__init__(self, bool_token)
 
@@ -149,8 +189,11 @@ class Bool(SimpleValue):
 
 class String(SimpleValue):
 
+    __slots__ = ()
+
     def __init__(self, str_token):
         SimpleValue.__init__(self, str_token)
+        self.value = str_token.lexeme.replace("\\'", "'")[1:-1]
 
     def get_value(self):
         return self.token.lexeme
@@ -161,6 +204,8 @@ class String(SimpleValue):
 
 class Int(SimpleValue):
 
+    __slots__ = ()
+
     def __init__(self, int_token):
         SimpleValue.__init__(self, int_token)
 
@@ -170,6 +215,8 @@ class Int(SimpleValue):
 
 class Real(SimpleValue):
 
+    __slots__ = ()
+
     def __init__(self, real_token):
         SimpleValue.__init__(self, real_token)
 
@@ -179,8 +226,14 @@ class Real(SimpleValue):
 
 class QualifiedName(object):
 
-    def __init__(self, identifier_tokens):
+    __slots__ = ("identifier_tokens", "variables", "getter")
+
+    def __init__(self, identifier_tokens, dict_access=False):
         self.identifier_tokens = identifier_tokens
+        self.variables = None
+        # accessor for the components after the first one
+        path = tuple(ident.lexeme for ident in identifier_tokens[1:])
+        self.getter = MemberGetter(path) if dict_access else operator.attrgetter(".".join(path))
 
     def accept(self, visitor):
         visitor.visit_expr(self)
@@ -192,8 +245,29 @@ class QualifiedName(object):
         return ".".join(list(map(lambda ident: ident.lexeme, self.identifier_tokens)))
 
 
+class MemberGetter(object):
+
+    # Like operator.attrgetter, but keys of mappings take precedence over
+    # attributes, so that dotted names work for nested dicts.
+
+    __slots__ = ("path",)
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, value):
+        for name in self.path:
+            if isinstance(value, Mapping) and name in value:
+                value = value[name]
+            else:
+                value = getattr(value, name)
+        return value
+
+
 class LogicalBinExpr(object):
 
+    __slots__ = ("op", "left", "right")
+
     def __init__(self, op, left, right):
         self.op = op
         self.left = left
@@ -203,12 +277,25 @@ class LogicalBinExpr(object):
         visitor.visit_logical_bin(self)
 
 
+RELATIONAL_OPERATORS = {
+    "==": operator.eq,
+    "<>": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le
+}
+
+
 class LogicalRelation(object):
 
+    __slots__ = ("op", "left", "right", "op_func")
+
     def __init__(self, op, left, right):
         self.op = op
         self.left = left
         self.right = right
+        self.op_func = RELATIONAL_OPERATORS.get(op.lexeme)  # None for unknown operators
 
     def accept(self, visitor):
         visitor.visit_logical_rel(self)
@@ -216,6 +303,8 @@ class LogicalRelation(object):
 
 class Negation(object):
 
+    __slots__ = ("expr",)
+
     def __init__(self, expr):
         self.expr = expr
 
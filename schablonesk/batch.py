@@ -0,0 +1,145 @@
+import json
+import os
+from schablonesk import CodeGenerator, create_worker_pool
+from schablonesk.incremental import DependencyState, get_dependencies, get_param_names
+from schablonesk.params import load_params
+
+
+class BatchJob(object):
+
+    def __init__(self, template_file, params, output_file, params_file=None):
+        self.template_file = template_file
+        self.params = params
+        self.output_file = output_file
+        self.params_file = params_file
+
+
+def read_manifest(manifest_file):
+    # Manifest is either a JSON list or JSONL with one job object per line.
+    # Relative paths are resolved against the directory of the manifest.
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    with open(manifest_file, "r") as f:
+        if manifest_file.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = json.load(f)
+    return [_create_job(base_dir, entry) for entry in entries]
+
+
+def _create_job(base_dir, entry):
+    if "template" not in entry or "output" not in entry:
+        raise Exception(f"Manifest entry needs 'template' and 'output': {entry}")
+    params = entry.get("params", {})
+    params_file = None
+    if isinstance(params, str):
+        params_file = os.path.join(base_dir, params)
+        params = load_params(params_file)
+    return BatchJob(
+        os.path.join(base_dir, entry["template"]),
+        params,
+        os.path.join(base_dir, entry["output"]),
+        params_file
+    )
+
+
+def run_batch(jobs, cache_dir=None, workers=None, state_file=None, config=None):
+    return BatchRunner(cache_dir, workers, state_file, config=config).run(jobs)
+
+
+class BatchRunner(object):
+
+    # Keeps one code generator per template directory, so jobs sharing a
+    # directory also share parsed templates and loaded imports, also across
+    # several runs. With a state file (or incremental=True for an in-memory
+    # state) only jobs whose template, imports or read params changed are
+    # rendered.
+
+    def __init__(self, cache_dir=None, workers=None, state_file=None, incremental=False, config=None):
+        self._cache_dir = cache_dir
+        self._config = config
+        self._workers = workers
+        self._state_file = state_file
+        self._state = DependencyState(state_file) if state_file is not None or incremental else None
+        self._code_generators = {}
+
+    def invalidate(self, changed_files):
+        for code_generator in self._code_generators.values():
+            code_generator.invalidate(changed_files)
+
+    def run(self, jobs):
+        # returns the jobs which have been rendered
+        state = self._state
+        if state is not None:
+            jobs = [job for job in jobs
+                    if not state.is_up_to_date(job.output_file, job.template_file, job.params)]
+        try:
+            if self._workers is None or self._workers <= 1 or len(jobs) <= 1:
+                for job in jobs:
+                    code_generator = self._get_code_generator(job)
+                    entry = self._create_state_entry(job, code_generator)
+                    output = code_generator.load(os.path.abspath(job.template_file)).render(**job.params)
+                    self._write_job(job, output, entry)
+                return jobs
+            return self._run_parallel(jobs)
+        finally:
+            # a failed render keeps the jobs which have not been written out
+            # of date
+            if state is not None and self._state_file is not None:
+                state.save()
+
+    def _run_parallel(self, jobs):
+        # all jobs share one pool, outputs are written as renders complete
+        from concurrent.futures import as_completed
+        rendered = set()
+        error = None
+        with create_worker_pool(self._workers) as executor:
+            futures = {}
+            for idx, job in enumerate(jobs):
+                code_generator = self._get_code_generator(job)
+                entry = self._create_state_entry(job, code_generator)
+                future = code_generator.submit(executor, os.path.abspath(job.template_file), job.params)
+                futures[future] = (idx, entry)
+            for future in as_completed(futures):
+                idx, entry = futures[future]
+                try:
+                    self._write_job(jobs[idx], future.result(), entry)
+                    rendered.add(idx)
+                except Exception as e:
+                    error = error or e
+        if error is not None:
+            raise error
+        return [job for idx, job in enumerate(jobs) if idx in rendered]
+
+    def _write_job(self, job, output, entry):
+        write_output(job.output_file, output)
+        if self._state is not None:
+            self._state.record(job.output_file, entry)
+
+    def _create_state_entry(self, job, code_generator):
+        state = self._state
+        if state is None:
+            return None
+        state.forget(job.output_file)
+        template = code_generator.load(os.path.abspath(job.template_file))
+        dependencies = get_dependencies(job.template_file, template, code_generator.create_template_exports())
+        return state.create_entry(job.template_file, dependencies, get_param_names(template), job.params)
+
+    def _get_code_generator(self, job):
+        search_dir = os.path.dirname(os.path.abspath(job.template_file))
+        code_generator = self._code_generators.get(search_dir)
+        if code_generator is None:
+            code_generator = CodeGenerator([search_dir],
+                                           cache_dir=self._cache_dir,
+                                           share_exports=True,
+                                           config=self._config)
+            self._code_generators[search_dir] = code_generator
+        return code_generator
+
+
+def write_output(output_file, output):
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output_file, "w") as f:
+        f.write(output)
+        f.write("\n")
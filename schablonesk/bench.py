@@ -0,0 +1,285 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from schablonesk.scanner import Scanner
+from schablonesk.parser import Parser
+from schablonesk.environment import Environment
+from schablonesk.interpreter import Interpreter
+from schablonesk.compiler import Compiler
+from schablonesk.template_exports import TemplateExports
+from schablonesk.params import dump_params, get_format, get_format_names, load_params
+from schablonesk.version import VERSION
+
+
+# Run with: python -m schablonesk.bench [--quick] [--output FILE]
+#
+# Every case is scanned, parsed, interpreted, compiled and rendered by the
+# compiled stream function. Times are the best of --repeat runs in seconds,
+# ops are the work units of a case (e.g. loop items) per second of rendering.
+#
+# Parameter loading is measured for all params formats with copies of the
+# bundled test/params.json as items.
+
+_SAMPLE_PARAMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "test", "params.json")
+
+
+def main(argv=None):
+    args = _create_arg_parser().parse_args(argv)
+    # the quick sizes apply only to sizes which are not given
+    max_items = args.max_items
+    if max_items is None:
+        max_items = 10 ** 4 if args.quick else 10 ** 6
+    params_scale = args.params_scale
+    if params_scale is None:
+        params_scale = 10 ** 3 if args.quick else 10 ** 5
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        results = [_run_case(case, args.repeat) for case in _create_cases(max_items, args.quick, work_dir)]
+        params_results = _run_params_formats(params_scale, args.repeat, work_dir)
+    finally:
+        shutil.rmtree(work_dir)
+
+    report = {
+        "version": VERSION,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "benchmarks": results,
+        "params_formats": params_results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def _create_arg_parser():
+    ret = argparse.ArgumentParser(prog="python -m schablonesk.bench",
+                                  description="Benchmark scanning, parsing and rendering")
+    ret.add_argument("--quick", action="store_true",
+                     help="use small sizes only")
+    ret.add_argument("--max-items", type=int,
+                     help="largest number of loop items (default: 10^6, 10^4 with --quick)")
+    ret.add_argument("--params-scale", type=int,
+                     help="number of params.json copies loaded per params format "
+                          "(default: 10^5, 10^3 with --quick)")
+    ret.add_argument("--repeat", type=int, default=3,
+                     help="number of runs per phase, the best one is reported")
+    ret.add_argument("--output",
+                     help="write the JSON report to this file instead of stdout")
+    return ret
+
+
+class _Case(object):
+
+    def __init__(self, name, size, code, params, ops, search_paths=None):
+        self.name = name
+        self.size = size
+        self.code = code
+        self.params = params
+        self.ops = ops
+        self.search_paths = search_paths or [os.curdir]
+
+
+def _create_cases(max_items, quick, work_dir):
+    cases = []
+
+    num_lines = 1000 if quick else 10000
+    cases.append(_Case("scan_parse", num_lines, _large_template(num_lines), {"items": [1, 2, 3]}, num_lines))
+
+    num_items = 1000
+    while num_items <= max_items:
+        code = ":> for item in items where item <> 1\n<li>$(item) $(is_first) $(is_last)</li>\n:> endfor"
+        cases.append(_Case("for_loop", num_items, code, {"items": list(range(num_items))}, num_items))
+        num_items *= 10
+
+    depth = 20 if quick else 100
+    cases.append(_Case("paste_nesting", depth, _nested_snippets(depth), {"value": "x"}, depth))
+
+    num_exprs = 1000 if quick else 10000
+    code = "\n".join(" ".join("$(a)$(b.c)" for _ in range(10)) for _ in range(num_exprs // 20))
+    cases.append(_Case("dense_text", num_exprs, code, {"a": "a", "b": _Value("c")}, num_exprs))
+
+    num_files = 10 if quick else 100
+    cases.append(_Case("use_imports", num_files, _library_files(num_files, work_dir), {"name": "x"}, num_files,
+                       [work_dir]))
+
+    return cases
+
+
+class _Value(object):
+
+    def __init__(self, c):
+        self.c = c
+
+
+def _large_template(num_lines):
+    lines = []
+    while len(lines) < num_lines:
+        n = len(lines)
+        lines += [
+            f":> snippet s{n}(a b)",
+            "$(a) and $(b)",
+            ":> endsnippet",
+            f":> for item in items where item <> {n}",
+            ":> cond",
+            ":>   is_first and not is_last",
+            "first $(item)",
+            ":> else",
+            f":> paste s{n}(item 'text') indent by 2 spaces",
+            ":> endcond",
+            ":> endfor"
+        ]
+    return "\n".join(lines)
+
+
+def _nested_snippets(depth):
+    # snippets only see their parameters, so every snippet gets the ones
+    # below it passed in
+    lines = [":> snippet s0(v)", "$(v)", ":> endsnippet"]
+    for level in range(1, depth):
+        inner = " ".join(f"p{idx}" for idx in range(level - 1))
+        lines += [f":> snippet s{level}({' '.join(f'p{idx}' for idx in range(level))} v)",
+                  f"<{level}>",
+                  f":> paste p{level - 1}({inner} v) indent by 1 spaces",
+                  ":> endsnippet"]
+    args = " ".join(f"s{idx}" for idx in range(depth - 1))
+    lines.append(f":> paste s{depth - 1}({args} value)")
+    return "\n".join(lines)
+
+
+def _library_files(num_files, work_dir):
+    lines = []
+    for idx in range(num_files):
+        with open(os.path.join(work_dir, f"lib{idx}.schablonesk"), "w") as f:
+            f.write(f":> snippet s{idx}(name)\nlib {idx}: $(name)\n:> endsnippet\n")
+        lines.append(f":> use s{idx} from 'lib{idx}.schablonesk'")
+    lines += [f":> paste s{idx}(name)" for idx in range(num_files)]
+    return "\n".join(lines)
+
+
+def _run_case(case, repeat):
+    phases = {}
+    phases["scan"], tokens = _best_time(lambda: Scanner().scan(case.code), repeat)
+    phases["parse"], ast = _best_time(lambda: Parser(list(tokens)).parse(), repeat)
+    phases["compile"], stream = _best_time(lambda: Compiler().compile_stream(ast), repeat)
+
+    def interpret():
+        return Interpreter(_create_env(case.params), TemplateExports(case.search_paths)).eval(ast)
+
+    def render_compiled():
+        return "".join(stream(_create_env(case.params), TemplateExports(case.search_paths)))
+
+    phases["interpret"], output = _best_time(interpret, repeat)
+    phases["render_compiled"], _ = _best_time(render_compiled, repeat)
+
+    return {
+        "name": case.name,
+        "size": case.size,
+        "output_bytes": len(output.encode("utf-8")),
+        "phases": phases,
+        "ops_per_sec": {
+            "interpret": _rate(case.ops, phases["interpret"]),
+            "render_compiled": _rate(case.ops, phases["render_compiled"])
+        },
+        "template_bytes": _retained_memory(lambda: Parser(Scanner().scan(case.code)).parse()),
+        "peak_memory_bytes": {
+            "parse": _peak_memory(lambda: Parser(Scanner().scan(case.code)).parse()),
+            "interpret": _peak_memory(interpret),
+            "render_compiled": _peak_memory(render_compiled)
+        }
+    }
+
+
+def _run_params_formats(scale, repeat, work_dir):
+    if os.path.exists(_SAMPLE_PARAMS_FILE):
+        sample = load_params(_SAMPLE_PARAMS_FILE)
+    else:
+        sample = {"title": "My most beloved Hobbies", "hobbies": ["Hacking", "Running", "Reading"]}
+    params = {"items": [dict(sample, id=idx) for idx in range(scale)]}
+
+    ret = []
+    for name in get_format_names():
+        if get_format(name).dump is None:
+            continue
+        params_file = os.path.join(work_dir, "params." + name)
+        dump_params(params, params_file, name)
+        load_time, _ = _best_time(lambda: load_params(params_file, params_format=name), repeat)
+        ret.append({
+            "format": name,
+            "size": scale,
+            "file_bytes": os.path.getsize(params_file),
+            "load": load_time
+        })
+        if name == "json":
+            def load_streaming():
+                for _ in load_params(params_file, streaming=True, params_format=name)["items"]:
+                    pass
+            ret.append({
+                "format": "json (streaming, incl. iteration)",
+                "size": scale,
+                "file_bytes": os.path.getsize(params_file),
+                "load": _best_time(load_streaming, repeat)[0]
+            })
+    return ret
+
+
+def _best_time(func, repeat):
+    best = None
+    result = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def _peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _retained_memory(func):
+    # memory still held by the result of func, e.g. a cached template
+    result = None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] - before
+    finally:
+        del result
+        tracemalloc.stop()
+
+
+def _rate(ops, seconds):
+    return ops / seconds if seconds > 0 else None
+
+
+def _create_env(params):
+    env = Environment()
+    for name, value in params.items():
+        env.set_value(name, value)
+    return env
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    main()
@@ -0,0 +1,622 @@
+import inspect
+import keyword
+import math
+import os
+import weakref
+from schablonesk.ast import *
+from schablonesk.parser import IndentationUnit
+from schablonesk.environment import UNDEFINED
+from schablonesk.loop import iter_loop_items, aiter_loop_items
+
+
+class Compiler(BaseVisitor):
+    # Translates a template AST into the source of a Python generator
+    # function stream(env, template_exports) which yields the output of
+    # Interpreter(env, template_exports).eval(template) in chunks.
+    #
+    # Generated code keeps two locals: _sep holds the separator that is still
+    # pending in front of the next chunk and _n counts the yielded chunks.
+    # Each statement either yields something (and consumes _sep) or leaves
+    # _sep unchanged, which mirrors the joining rules of the interpreter.
+    #
+    # With async_mode the functions become async generators: values of
+    # identifiers, attributes and calls are awaited if they are awaitable and
+    # loops also accept async iterables. Async generators cannot return a
+    # value, so snippets store (emitted, is_none) in the list _result instead.
+
+    _REL_OPS = {
+        "==": "==",
+        "<>": "!=",
+        ">": ">",
+        ">=": ">=",
+        "<": "<",
+        "<=": "<="
+    }
+
+    def __init__(self, async_mode=False):
+        BaseVisitor.__init__(self)
+        self._async = async_mode
+        self._lines = []
+        self._indent_level = 0
+        self._constants = {}
+        self._num_vars = 0
+        self._locals = {}
+        self._root_scope = None  # root scope of a template, values are mirrored to env
+        self._stack = []
+
+    def compile(self, template):
+        stream = self.compile_stream(template)
+
+        def render(env, template_exports, snippet_cache=None):
+            return "".join(stream(env, template_exports, snippet_cache))
+
+        return render
+
+    def compile_stream(self, template):
+        self._begin_function("stream", "env, exports, snippet_cache=None")
+        if self._async:
+            # Results of awaitables reached by names, coroutines can only be
+            # awaited once. Weak keys drop the results of per item values.
+            self._emit("_awaited = _WeakKeyDictionary()")
+        self._emit('_sep = ""')
+        self._emit("_n = 0")
+        self._gen(template)
+        return self._end_function()
+
+    def compile_snippet(self, snippet):
+        if self._async:
+            self._begin_function("stream_snippet", "exports, snippet_cache, _sep, _args, _awaited, _result")
+        else:
+            self._begin_function("stream_snippet", "exports, snippet_cache, _sep, _args")
+        self._emit("_n = 0")
+        params = [self._local(snippet.scope.variables[param.lexeme]) for param in snippet.params]
+        if params:
+            self._emit(f"{', '.join(params)}, = _args")
+        self._init_locals(snippet.scope)
+        is_none = self._gen_blocks(snippet.statements)
+        if self._async:
+            self._emit(f"_result[:] = _n != 0, {is_none}")
+        else:
+            self._emit(f"return _n != 0, {is_none}")
+        return self._end_function()
+
+    def get_source(self):
+        return "\n".join(self._lines)
+
+    def _begin_function(self, name, params):
+        self._function_name = name
+        self._emit(f"{'async def' if self._async else 'def'} {name}({params}):")
+        self._indent()
+        # make sure that the function is a generator
+        self._emit("if False: yield")
+
+    def _end_function(self):
+        self._dedent()
+        namespace = {
+            "_LINESEP": os.linesep,
+            "_UNDEFINED": UNDEFINED,
+            "_iter_loop_items": iter_loop_items,
+            "_aiter_loop_items": aiter_loop_items,
+            "_resolve": _resolve,
+            "_resolve_call": _resolve_call,
+            "_WeakKeyDictionary": weakref.WeakKeyDictionary,
+            "_apaste": _apaste,
+            "_apaste_indented": _apaste_indented,
+            "_undefined": _undefined,
+            "_unknown_snippet": _unknown_snippet,
+            "_paste": _paste,
+            "_paste_indented": _paste_indented,
+            "_no_value": _no_value
+        }
+        namespace.update(self._constants)
+        code = compile(self.get_source(), "<schablonesk>", "exec")
+        exec(code, namespace)
+        return namespace[self._function_name]
+
+    def _gen(self, node):
+        self._stack.append(None)
+        node.accept(self)
+        return self._stack.pop()
+
+    def _set_ret_value(self, value):
+        self._stack[-1] = value
+
+    # Statements set an expression telling whether their value is None
+    # (cond without matching branch, loop without items)
+
+    def visit_template(self, templ):
+        self._root_scope = templ.scope
+        for variable in templ.scope.variables.values():
+            self._emit(f"{self._local(variable)} = env.lookup({variable.name!r})")
+        for usage in templ.usages:
+            usage.accept(self)
+        for snippet in templ.snippets:
+            snippet.accept(self)
+        for idx, stmt in enumerate(templ.statements):
+            if idx > 0:
+                self._emit("if _n: yield _LINESEP")
+            is_none = self._gen(stmt)
+            if is_none != "False":
+                self._emit(f"if {is_none}: _no_value()")
+        self._root_scope = None
+
+    def visit_use(self, use):
+        templ_name = use.template_name.value
+        exports = self._new_var()
+        self._emit(f"{exports} = exports.get_exports({templ_name!r})")
+        if use.names:
+            for (name_id, alias_id) in use.names:
+                name = name_id.lexeme
+                alias = alias_id is not None and alias_id.lexeme or name
+                message = f"'{name}' is not provided by '{templ_name}'"
+                self._emit(f"if {name!r} not in {exports}: raise Exception({message!r})")
+                self._set_root_value(self._root_scope.variables[alias], f"{exports}[{name!r}]")
+        else:
+            self._emit(f"for _name, _ast in {exports}.items(): env.set_value(_name, _ast)")
+            for variable in self._root_scope.variables.values():
+                self._emit(f"if {variable.name!r} in {exports}: "
+                           f"{self._local(variable)} = {exports}[{variable.name!r}]")
+
+    def visit_snippet(self, snippet):
+        variable = self._root_scope.variables[snippet.name.lexeme]
+        self._set_root_value(variable, self._const(snippet))
+
+    def _set_root_value(self, variable, value):
+        local = self._local(variable)
+        self._emit(f"{local} = {value}")
+        self._emit(f"env.set_value({variable.name!r}, {local})")
+
+    def visit_text(self, text):
+        parts = [repr(part) if isinstance(part, str) else f"str({self._gen(part)})"
+                 for part in text.parts]
+        if len(parts) == 1 and self._is_literal(parts[0]):
+            self._yield(parts[0])
+        elif parts:
+            value = self._new_var()
+            self._emit(f"{value} = {' + '.join(parts)}")
+            self._emit(f"if {value}:")
+            self._indent()
+            self._yield(value)
+            self._dedent()
+        self._set_ret_value("False")
+
+    def visit_block(self, block):
+        start_n = self._new_var()
+        self._emit(f"{start_n} = _n")
+        for idx, stmt in enumerate(block.statements):
+            if idx > 0:
+                self._emit(f"if _n != {start_n}: _sep = _LINESEP")
+            self._gen(stmt)
+        if len(block.statements) > 1:
+            self._emit(f'if _n != {start_n}: _sep = ""')
+        self._set_ret_value("False")
+
+    def visit_cond(self, cond_block):
+        if not cond_block.branches:
+            self._set_ret_value("True")  # e.g. all branches removed by the optimizer
+            return
+        is_none = self._new_var()
+        keyword_ = "if"
+        for condition, stmt in cond_block.branches:
+            self._emit(f"{keyword_} {self._gen(condition)}:")
+            self._indent()
+            self._emit(f"{is_none} = {self._gen(stmt)}")
+            self._dedent()
+            keyword_ = "elif"
+        self._emit("else:")
+        self._indent()
+        self._emit(f"{is_none} = True")
+        self._dedent()
+        self._set_ret_value(is_none)
+
+    def visit_for(self, for_block):
+        item_var_name = for_block.item_ident.get_name()
+        items = self._new_var()
+        self._emit(f"{items} = {self._gen(for_block.list_expr)}")
+        if self._async:
+            self._emit(f"if not hasattr({items}, '__aiter__'):")
+            self._indent()
+        self._emit("try:")
+        self._indent()
+        self._emit(f"{items} = iter({items})")
+        self._dedent()
+        self._emit("except TypeError:")
+        self._indent()
+        self._emit('raise Exception("Cannot loop over non-list")')
+        self._dedent()
+        if self._async:
+            self._dedent()
+
+        scope = for_block.scope
+        self._init_locals(scope)
+        start_n, start_sep, not_none = self._begin_join()
+        item = self._local(scope.variables[item_var_name])
+        is_first = self._local(scope.variables["is_first"])
+        is_last = self._local(scope.variables["is_last"])
+        if self._async:
+            self._emit(f"async for {item}, {is_first}, {is_last} in _aiter_loop_items({items}):")
+        else:
+            self._emit(f"for {item}, {is_first}, {is_last} in _iter_loop_items({items}):")
+        self._indent()
+        if for_block.filter_cond:
+            self._emit(f"if not {self._gen(for_block.filter_cond)}: continue")
+        self._set_join_separator(start_n, start_sep, not_none)
+        body_start_n = self._new_var()
+        self._emit(f"{body_start_n} = _n")
+        body_is_none = self._gen_blocks(for_block.statements)
+        self._emit(f"if not {body_is_none}:")
+        self._indent()
+        # an empty body still adds a separator to the loop output
+        self._emit(f"if {not_none} and _n == {body_start_n}:")
+        self._indent()
+        self._yield()
+        self._dedent()
+        self._emit(f"{not_none} = True")
+        self._dedent()
+        self._dedent()
+        self._set_ret_value(self._end_join(start_n, start_sep, not_none))
+
+    def visit_assignment(self, assignment):
+        value = self._gen(assignment.source)
+        variable = assignment.variable
+        if variable.level == 0 and self._root_scope is not None:
+            self._set_root_value(variable, value)
+        else:
+            self._emit(f"{self._local(variable)} = {value}")
+        self._set_ret_value("False")
+
+    def _gen_blocks(self, blocks):
+        # The first value which is not None starts the output, further
+        # values are only appended if they are not empty
+        start_n, start_sep, not_none = self._begin_join()
+        for idx, block in enumerate(blocks):
+            if idx > 0:
+                self._set_join_separator(start_n, start_sep, not_none)
+            is_none = self._gen(block)
+            if is_none == "False":
+                self._emit(f"{not_none} = True")
+            elif is_none != "True":
+                self._emit(f"if not {is_none}: {not_none} = True")
+        return self._end_join(start_n, start_sep, not_none)
+
+    def _begin_join(self):
+        start_n = self._new_var()
+        start_sep = self._new_var()
+        not_none = self._new_var()
+        self._emit(f"{start_n}, {start_sep}, {not_none} = _n, _sep, False")
+        return start_n, start_sep, not_none
+
+    def _set_join_separator(self, start_n, start_sep, not_none):
+        self._emit(f"if {not_none}: _sep = _LINESEP if _n != {start_n} else {start_sep} + _LINESEP")
+
+    def _end_join(self, start_n, start_sep, not_none):
+        self._emit(f"_sep = '' if _n != {start_n} else {start_sep}")
+        is_none = self._new_var()
+        self._emit(f"{is_none} = not {not_none}")
+        return is_none
+
+    def _yield(self, value=None):
+        self._emit(f"yield _sep + {value}" if value else "yield _sep")
+        self._emit('_sep = ""')
+        self._emit("_n += 1")
+
+    def visit_snippet_call(self, snippet_call):
+        snippet_name = snippet_call.name.lexeme
+        snippet = self._new_var()
+        lookup = self._lookup(snippet_call.variables, f"_unknown_snippet({snippet_name!r})")
+        self._emit(f"{snippet} = {lookup}")
+        num_args = len(snippet_call.args)
+        self._emit(f"if len({snippet}.params) != {num_args}:")
+        self._indent()
+        self._emit(f'raise Exception(f"#args (={num_args}) does not match #params (={{len({snippet}.params)}})")')
+        self._dedent()
+
+        arg_values = "".join(f"{self._gen(arg)}, " for arg in snippet_call.args)
+        emitted = self._new_var()
+        is_none = self._new_var()
+
+        if snippet_call.indent:
+            value_expr, unit = snippet_call.indent
+            value = self._new_var()
+            self._emit(f"{value} = {self._gen(value_expr)}")
+            self._emit(f"if not isinstance({value}, int):")
+            self._indent()
+            self._emit('raise Exception("Indentation value must be an integer")')
+            self._dedent()
+            indent_char = "\t" if unit == IndentationUnit.TABS else " "
+            self._yield_from(emitted, is_none, "_paste_indented",
+                             f"{snippet}, ({arg_values}), exports, snippet_cache, _sep, {indent_char!r} * {value}")
+        else:
+            self._yield_from(emitted, is_none, "_paste", f"{snippet}, ({arg_values}), exports, snippet_cache, _sep")
+        self._emit(f'if {emitted}: _sep = ""; _n += 1')
+
+        self._set_ret_value(is_none)
+
+    def _yield_from(self, emitted, is_none, paste_func, args):
+        if not self._async:
+            self._emit(f"{emitted}, {is_none} = yield from {paste_func}({args})")
+            return
+        result = self._new_var()
+        self._emit(f"{result} = []")
+        self._emit(f"async for _chunk in _a{paste_func[1:]}({args}, _awaited, {result}): yield _chunk")
+        self._emit(f"{emitted}, {is_none} = {result}")
+
+    def visit_call(self, func_call):
+        callee = self._gen(func_call.callee)
+        arg_values = ", ".join(self._gen(arg) for arg in func_call.args)
+        # every call returns a new awaitable, its result is not kept
+        call = f"{callee}({arg_values})"
+        self._set_ret_value(f"(await _resolve_call({call}))" if self._async else call)
+
+    def visit_expr(self, expr):
+        if isinstance(expr, String):
+            ret = repr(expr.value)
+        elif isinstance(expr, Real):
+            value = expr.value
+            ret = repr(value) if math.isfinite(value) else self._const(value)
+        elif isinstance(expr, SimpleValue):
+            ret = repr(expr.value)
+        elif isinstance(expr, Identifier):
+            name = expr.get_name()
+            ret = self._await(self._lookup(expr.variables, f"_undefined({name!r}, {expr.token.line_num})"))
+        elif isinstance(expr, QualifiedName):
+            path = [tok.lexeme for tok in expr.identifier_tokens]
+            line_num = expr.identifier_tokens[0].line_num
+            ret = self._await(self._lookup(expr.variables, f"_undefined({path[0]!r}, {line_num})"))
+            if isinstance(expr.getter, MemberGetter) and not self._async:
+                ret = f"{self._const(expr.getter)}({ret})"
+            else:
+                for component in path[1:]:
+                    if isinstance(expr.getter, MemberGetter):
+                        ret = f"{self._const(MemberGetter((component,)))}({ret})"
+                    elif keyword.iskeyword(component):
+                        ret = f"getattr({ret}, {component!r})"
+                    else:
+                        ret += "." + component
+                    ret = self._await(ret)
+        else:
+            raise Exception(f"Line {expr.token.line_num}: Unsupported expression {expr.token.lexeme}")
+        self._set_ret_value(ret)
+
+    def visit_logical_bin(self, logical_bin):
+        op = logical_bin.op.lexeme
+        if op not in ("or", "and"):
+            raise Exception(f"Line {logical_bin.op.line_num}: Unknown operator {op}")
+        left = self._gen(logical_bin.left)
+        right = self._gen(logical_bin.right)
+        self._set_ret_value(f"({left} {op} {right})")
+
+    def visit_logical_rel(self, logical_rel):
+        op = logical_rel.op.lexeme
+        if op not in self._REL_OPS:
+            raise Exception(f"Line {logical_rel.op.line_num}: Unknown operator {op}")
+        left = self._gen(logical_rel.left)
+        right = self._gen(logical_rel.right)
+        self._set_ret_value(f"({left} {self._REL_OPS[op]} {right})")
+
+    def visit_negation(self, negation):
+        self._set_ret_value(f"(not {self._gen(negation.expr)})")
+
+    def _lookup(self, variables, fallback):
+        # checks all candidate variables, innermost first
+        ret = fallback
+        for variable in reversed(variables):
+            local = self._local(variable)
+            if variable.definite:
+                ret = local
+            else:
+                ret = f"({local} if {local} is not _UNDEFINED else {ret})"
+        return ret
+
+    def _await(self, expr):
+        return f"(await _resolve({expr}, _awaited))" if self._async else expr
+
+    def _local(self, variable):
+        local = self._locals.get(variable)
+        if local is None:
+            local = f"_{variable.name}_{len(self._locals)}"
+            self._locals[variable] = local
+        return local
+
+    def _init_locals(self, scope):
+        for variable in scope.variables.values():
+            if not variable.definite:
+                self._emit(f"{self._local(variable)} = _UNDEFINED")
+
+    @staticmethod
+    def _is_literal(value):
+        return value.startswith(("'", '"'))
+
+    def _new_var(self):
+        self._num_vars += 1
+        return f"_v{self._num_vars}"
+
+    def _const(self, value):
+        name = f"_c{len(self._constants)}"
+        self._constants[name] = value
+        return name
+
+    def _emit(self, line):
+        self._lines.append("    " * self._indent_level + line)
+
+    def _indent(self):
+        self._indent_level += 1
+
+    def _dedent(self):
+        self._indent_level -= 1
+
+
+_snippet_functions = weakref.WeakKeyDictionary()
+_async_snippet_functions = weakref.WeakKeyDictionary()
+
+
+def _undefined(name, line_num):
+    raise Exception(f"Line {line_num}: Identifier {name} is not defined")
+
+
+def _unknown_snippet(name):
+    raise Exception(f"Unknown snippet {name}")
+
+
+def _paste(snippet, arg_values, template_exports, snippet_cache, sep):
+    key = snippet_cache.make_key(snippet, arg_values) if snippet_cache is not None else None
+    if key is None:
+        return (yield from _stream_snippet(snippet, arg_values, template_exports, snippet_cache, sep))
+    value = snippet_cache.get(key)
+    if value is UNDEFINED:
+        value = _collect(_stream_snippet(snippet, arg_values, template_exports, snippet_cache, ""))
+        snippet_cache.put(key, value)
+    if value:
+        yield sep + value
+    return bool(value), value is None
+
+
+def _paste_indented(snippet, arg_values, template_exports, snippet_cache, sep, indent):
+    key = snippet_cache.make_key(snippet, arg_values, indent) if snippet_cache is not None else None
+    if key is None:
+        return (yield from _stream_indented(snippet, arg_values, template_exports, snippet_cache, sep, indent))
+    value = snippet_cache.get(key)
+    if value is UNDEFINED:
+        value = _collect(_stream_indented(snippet, arg_values, template_exports, snippet_cache, "", indent))
+        snippet_cache.put(key, value)
+    if value:
+        yield sep + value
+    return bool(value), False
+
+
+def _stream_snippet(snippet, arg_values, template_exports, snippet_cache, sep):
+    stream_snippet = _snippet_functions.get(snippet)
+    if stream_snippet is None:
+        stream_snippet = Compiler().compile_snippet(snippet)
+        _snippet_functions[snippet] = stream_snippet
+    return stream_snippet(template_exports, snippet_cache, sep, arg_values)
+
+
+def _stream_indented(snippet, arg_values, template_exports, snippet_cache, sep, indent):
+    chunks = _stream_snippet(snippet, arg_values, template_exports, snippet_cache, "" if indent else sep)
+    if not indent:
+        emitted, is_none = yield from chunks
+        if is_none:
+            _no_value()
+        return emitted, False
+    # every line of the snippet output (even an empty one) gets indented
+    prefix = sep + indent
+    while True:
+        try:
+            chunk = next(chunks)
+        except StopIteration as stop:
+            _, is_none = stop.value
+            break
+        yield prefix + chunk.replace(os.linesep, os.linesep + indent)
+        prefix = ""
+    if is_none:
+        _no_value()
+    if prefix:
+        yield prefix
+    return True, False
+
+
+def _collect(chunks):
+    values = []
+    while True:
+        try:
+            values.append(next(chunks))
+        except StopIteration as stop:
+            _, is_none = stop.value
+            return None if is_none else "".join(values)
+
+
+def _no_value():
+    raise TypeError("Statement did not produce any value")
+
+
+async def _resolve(value, awaited):
+    if not inspect.isawaitable(value):
+        return value
+    try:
+        return awaited[value]
+    except KeyError:
+        ret = awaited[value] = await value
+    except TypeError:  # not hashable or not weakly referenceable
+        ret = await value
+    return ret
+
+
+async def _resolve_call(value):
+    return await value if inspect.isawaitable(value) else value
+
+
+async def _apaste(snippet, arg_values, template_exports, snippet_cache, sep, awaited, result):
+    key = snippet_cache.make_key(snippet, arg_values) if snippet_cache is not None else None
+    if key is None:
+        async for chunk in _astream_snippet(snippet, arg_values, template_exports, snippet_cache, sep,
+                                            awaited, result):
+            yield chunk
+        return
+    value = snippet_cache.get(key)
+    if value is UNDEFINED:
+        value_result = []
+        value = await _acollect(_astream_snippet(snippet, arg_values, template_exports, snippet_cache, "",
+                                                 awaited, value_result),
+                                value_result)
+        snippet_cache.put(key, value)
+    if value:
+        yield sep + value
+    result[:] = bool(value), value is None
+
+
+async def _apaste_indented(snippet, arg_values, template_exports, snippet_cache, sep, indent, awaited, result):
+    key = snippet_cache.make_key(snippet, arg_values, indent) if snippet_cache is not None else None
+    if key is None:
+        async for chunk in _astream_indented(snippet, arg_values, template_exports, snippet_cache, sep, indent,
+                                             awaited, result):
+            yield chunk
+        return
+    value = snippet_cache.get(key)
+    if value is UNDEFINED:
+        value_result = []
+        value = await _acollect(_astream_indented(snippet, arg_values, template_exports, snippet_cache, "",
+                                                  indent, awaited, value_result),
+                                value_result)
+        snippet_cache.put(key, value)
+    if value:
+        yield sep + value
+    result[:] = bool(value), False
+
+
+def _astream_snippet(snippet, arg_values, template_exports, snippet_cache, sep, awaited, result):
+    stream_snippet = _async_snippet_functions.get(snippet)
+    if stream_snippet is None:
+        stream_snippet = Compiler(async_mode=True).compile_snippet(snippet)
+        _async_snippet_functions[snippet] = stream_snippet
+    return stream_snippet(template_exports, snippet_cache, sep, arg_values, awaited, result)
+
+
+async def _astream_indented(snippet, arg_values, template_exports, snippet_cache, sep, indent, awaited, result):
+    snippet_result = []
+    chunks = _astream_snippet(snippet, arg_values, template_exports, snippet_cache, "" if indent else sep,
+                              awaited, snippet_result)
+    if not indent:
+        async for chunk in chunks:
+            yield chunk
+        emitted, is_none = snippet_result
+        if is_none:
+            _no_value()
+        result[:] = emitted, False
+        return
+    prefix = sep + indent
+    async for chunk in chunks:
+        yield prefix + chunk.replace(os.linesep, os.linesep + indent)
+        prefix = ""
+    _, is_none = snippet_result
+    if is_none:
+        _no_value()
+    if prefix:
+        yield prefix
+    result[:] = True, False
+
+
+async def _acollect(chunks, result):
+    values = [chunk async for chunk in chunks]
+    _, is_none = result
+    return None if is_none else "".join(values)
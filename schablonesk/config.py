@@ -1,5 +1,8 @@
 class Config(object):
 
+    # Config.get() is the process wide default. Code generators take a copy
+    # of their config, so changing the default later does not affect them.
+
     _single = None
 
     @staticmethod
@@ -8,10 +11,12 @@ class Config(object):
             Config._single = Config()
         return Config._single
 
-    def __init__(self):
-        self._cmd_line_begin = ":>"
-        self._templ_str_begin = "$("
-        self._templ_str_end = ")"
+    def __init__(self, cmd_line_begin=":>", templ_str_begin="$(", templ_str_end=")", dict_access=False):
+        self._cmd_line_begin = cmd_line_begin
+        self._templ_str_begin = templ_str_begin
+        self._templ_str_end = templ_str_end
+        # dotted names also look up keys of dicts, e.g. for JSON params
+        self._dict_access = dict_access
 
     def get_cmd_line_begin(self):
         return self._cmd_line_begin
@@ -25,3 +30,15 @@ class Config(object):
     def set_templ_str_delimiters(self, begin, end):
         self._templ_str_begin = begin
         self._templ_str_end = end
+
+    def get_dict_access(self):
+        return self._dict_access
+
+    def set_dict_access(self, dict_access):
+        self._dict_access = dict_access
+
+    def copy(self):
+        return Config(self._cmd_line_begin, self._templ_str_begin, self._templ_str_end, self._dict_access)
+
+    def key(self):
+        return self._cmd_line_begin, self._templ_str_begin, self._templ_str_end, self._dict_access
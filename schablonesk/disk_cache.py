@@ -0,0 +1,58 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from schablonesk.config import Config
+from schablonesk.version import VERSION
+
+
+class DiskCache(object):
+
+    # Stores parsed templates as pickle files in cache_dir. An entry is only
+    # used if path, modification time, size, schablonesk version and the
+    # configured delimiters still match, otherwise the template is parsed
+    # again and the entry is replaced.
+
+    def __init__(self, cache_dir, config=None):
+        self._cache_dir = cache_dir
+        self._config = config if config is not None else Config.get()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def load(self, template_path):
+        cache_file = self._get_cache_file(template_path)
+        try:
+            with open(cache_file, "rb") as f:
+                key, ast = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError, ValueError):
+            return None
+        if key != self._make_key(template_path):
+            return None
+        return ast
+
+    def store(self, template_path, ast):
+        key = self._make_key(template_path)
+        fd, tmp_file = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((key, ast), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self._get_cache_file(template_path))
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+
+    def _get_cache_file(self, template_path):
+        # one file per template and config, so generators with different
+        # configs do not replace each other's entries
+        abs_path = os.path.abspath(template_path)
+        name = hashlib.sha256(repr((abs_path, self._config.key())).encode("utf-8")).hexdigest()
+        return os.path.join(self._cache_dir, name + ".pickle")
+
+    def _make_key(self, template_path):
+        stat = os.stat(template_path)
+        return (
+            os.path.abspath(template_path),
+            stat.st_mtime_ns,
+            stat.st_size,
+            VERSION,
+            self._config.key()
+        )
@@ -1,3 +1,13 @@
+
+class _Undefined(object):
+
+    def __repr__(self):
+        return "UNDEFINED"
+
+
+UNDEFINED = _Undefined()
+
+
 class Environment(object):
 
     def __init__(self, parent=None):
@@ -8,10 +18,33 @@ class Environment(object):
         self._values[name] = value
 
     def get_value(self, name):
-        if name in self._values:
-            return self._values[name]
-        elif self._parent is not None:
-            return self._parent.get_value(name)
-        else:
-            return None
+        value = self.lookup(name)
+        return value if value is not UNDEFINED else None
 
+    def lookup(self, name):
+        env = self
+        while env is not None:
+            if name in env._values:
+                return env._values[name]
+            env = env._parent
+        return UNDEFINED
+
+
+class Frame(object):
+
+    # Slot based storage for the variables of a resolved scope. The display
+    # holds the frames of all enclosing scopes indexed by their level, so
+    # that every variable is reached with a single index operation.
+
+    def __init__(self, scope, parent=None, env=None):
+        self.scope = scope
+        self.values = [UNDEFINED] * len(scope.variables)
+        self.display = parent.display + (self,) if parent is not None else (self,)
+        self.env = env  # receives all values set in the root frame of a template
+
+    def set_value(self, name, value):
+        variable = self.scope.variables.get(name)
+        if variable is not None:
+            self.values[variable.index] = value
+        if self.env is not None:
+            self.env.set_value(name, value)
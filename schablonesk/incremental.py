@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import tempfile
+from schablonesk.version import VERSION
+
+
+class DependencyState(object):
+
+    # Remembers for each output file the files it was generated from (the
+    # template and all templates imported by use) together with their
+    # modification time and size, and a fingerprint of the params the
+    # template reads. The state is kept as JSON in state_file.
+
+    def __init__(self, state_file):
+        self._state_file = state_file
+        self._outputs = {}
+        if state_file is None:  # in-memory state
+            return
+        try:
+            with open(state_file, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("version") == VERSION:
+            self._outputs = state.get("outputs", {})
+
+    def is_up_to_date(self, output_file, template_file, params):
+        entry = self._outputs.get(os.path.abspath(output_file))
+        if entry is None or not os.path.exists(output_file):
+            return False
+        if entry["template"] != os.path.abspath(template_file):
+            return False
+        if entry["params"] != fingerprint_params(entry["param_names"], params):
+            return False
+        for path, mtime_ns, size in entry["files"]:
+            if _get_file_stat(path) != [mtime_ns, size]:
+                return False
+        return True
+
+    def create_entry(self, template_file, dependency_files, param_names, params):
+        # taken before rendering, so changes during the render are picked up
+        # by the next run
+        param_names = sorted(param_names)
+        return {
+            "template": os.path.abspath(template_file),
+            "files": [[os.path.abspath(path)] + _get_file_stat(path) for path in dependency_files],
+            "param_names": param_names,
+            "params": fingerprint_params(param_names, params)
+        }
+
+    def record(self, output_file, entry):
+        # only after the output file has been written
+        self._outputs[os.path.abspath(output_file)] = entry
+
+    def forget(self, output_file):
+        self._outputs.pop(os.path.abspath(output_file), None)
+
+    def save(self):
+        state_dir = os.path.dirname(os.path.abspath(self._state_file))
+        fd, tmp_file = tempfile.mkstemp(dir=state_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": VERSION, "outputs": self._outputs}, f, indent=1, sort_keys=True)
+            os.replace(tmp_file, self._state_file)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+
+
+def get_dependencies(template_file, template, template_exports):
+    # Imports are static, so the files a template depends on are the
+    # template itself and the files named in its use statements
+    files = [template_file]
+    for usage in template.ast.usages:
+        template_name = usage.template_name.value
+        files.append(template_exports.get_template_path(template_name))
+    return files
+
+
+def get_param_names(template):
+    # names of the template scope are looked up in the params
+    return list(template.ast.scope.variables)
+
+
+def fingerprint_params(param_names, params):
+    values = [[name, params[name]] if name in params else [name] for name in param_names]
+    # values which are not JSON serializable are fingerprinted by their repr
+    # and, if that includes an address, just cause a re-render
+    data = json.dumps(values, sort_keys=True, default=repr)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _get_file_stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return [None, None]
+    return [stat.st_mtime_ns, stat.st_size]
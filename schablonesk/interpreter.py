@@ -1,18 +1,19 @@
 import os
 from schablonesk.ast import *
-from schablonesk.config import Config
-from schablonesk.scanner import Scanner
-from schablonesk.parser import Parser, IndentationUnit
-from schablonesk.environment import Environment
+from schablonesk.parser import IndentationUnit
+from schablonesk.environment import Frame, UNDEFINED
+from schablonesk.loop import iter_loop_items
 from schablonesk.template_exports import TemplateExports
 
 
 class Interpreter(BaseVisitor):
 
-    def __init__(self, environment, template_exports=TemplateExports([os.curdir])):
+    def __init__(self, environment, template_exports=TemplateExports([os.curdir]), snippet_cache=None):
         BaseVisitor.__init__(self)
         self._env = environment
         self._template_exports = template_exports
+        self._snippet_cache = snippet_cache
+        self._frame = None
         self._stack = []
 
     def eval(self, ast):
@@ -20,118 +21,142 @@ class Interpreter(BaseVisitor):
         ast.accept(self)
         return self._stack.pop()
 
+    def _eval_expr(self, expr):
+        # literals and names are evaluated without a visit
+        evaluate = self._EXPR_EVALUATORS.get(expr.__class__)
+        if evaluate is not None:
+            return evaluate(self, expr)
+        return self.eval(expr)
+
     def _set_ret_value(self, value):
         self._stack[-1] = value
 
     def visit_template(self, templ):
-        ret = ""
-        for usage in templ.usages:
-            usage.accept(self)
-        for snippet in templ.snippets:
-            snippet.accept(self)
-        for stmt in templ.statements:
-            if ret:
-                ret += os.linesep
-            ret += self.eval(stmt)
-        self._set_ret_value(ret)
+        self._set_ret_value("".join(self._iter_template(templ, False)))
 
-    def visit_text(self, text):
-        config = Config.get()
-        begin, end = config.get_templ_str_delimiters()
-        cmd_line_begin = config.get_cmd_line_begin()
-        content = text.content
-        ret = ""
-        search_pos = 0
-        while True:
-            pos = content.find(begin, search_pos)
-            if pos != -1:
-                ret += content[search_pos:pos]
-                search_pos = pos + len(begin)
-                pos = content.find(end, search_pos)
-                if pos != -1:
-                    expr_str = cmd_line_begin + content[search_pos:pos]
-                    ast = Parser(Scanner().scan(expr_str)).parse_expr()
-                    ret += str(self.eval(ast))
-                    search_pos = pos + len(end)
+    def stream(self, templ):
+        # Yields the output of a template in chunks: one per statement and
+        # one per item of loops at the top level, which usually produce most
+        # of the output
+        return self._iter_template(templ, True)
+
+    def _iter_template(self, templ, split_loops):
+        not_empty = False
+        outer_frame = self._frame
+        self._frame = self._create_root_frame(templ.scope)
+        try:
+            for usage in templ.usages:
+                usage.accept(self)
+            for snippet in templ.snippets:
+                snippet.accept(self)
+            for stmt in templ.statements:
+                sep = os.linesep if not_empty else ""
+                if split_loops and isinstance(stmt, ForBlock):
+                    num_values = 0
+                    for value in self._iter_for(stmt):
+                        yield (os.linesep if num_values else sep) + value
+                        num_values += 1
+                        not_empty = not_empty or num_values > 1 or bool(value)
+                    if not num_values:
+                        _no_value()
                 else:
-                    ret += content[search_pos:]
-                    break
-            else:
-                ret += content[search_pos:]
-                break
+                    value = self.eval(stmt)
+                    if value is None:
+                        _no_value()
+                    yield sep + value
+                    not_empty = not_empty or bool(value)
+        finally:
+            self._frame = outer_frame
+
+    def _create_root_frame(self, scope):
+        frame = Frame(scope, env=self._env)
+        for variable in scope.variables.values():
+            frame.values[variable.index] = self._env.lookup(variable.name)
+        return frame
+
+    def visit_text(self, text):
+        ret = "".join([part if isinstance(part, str) else str(self._eval_expr(part))
+                       for part in text.parts])
         self._set_ret_value(ret)
 
     def visit_block(self, block):
-        ret = ""
-        for stmt in block.statements:
-            value = self.eval(stmt)
-            if value:
-                if ret:
-                    ret += os.linesep + value
-                else:
-                    ret = value
-        self._set_ret_value(ret)
+        values = [self.eval(stmt) for stmt in block.statements]
+        self._set_ret_value(os.linesep.join([value for value in values if value]))
 
     def visit_cond(self, cond_block):
         for condition, block in cond_block.branches:
-            if self.eval(condition):
+            if self._eval_expr(condition):
                 self._set_ret_value(self.eval(block))
                 break
 
     def visit_for(self, for_block):
+        values = list(self._iter_for(for_block))
+        self._set_ret_value(os.linesep.join(values) if values else None)
+
+    def _iter_for(self, for_block):
+        # values of the iterations which are not None
         item_var_name = for_block.item_ident.get_name()
+        items = self.eval(for_block.list_expr)
         try:
-            items = list(self.eval(for_block.list_expr))
+            items = iter(items)
         except TypeError:
             raise Exception("Cannot loop over non-list")
 
-        for_env = Environment(parent=self._env)
-        interpreter = Interpreter(for_env, self._template_exports)
-        ret = None
-
-        last_idx = len(items) - 1
-        for idx, item in enumerate(items):
-            for_env.set_value(item_var_name, item)
-            for_env.set_value("is_first", idx == 0)
-            for_env.set_value("is_last", idx == last_idx)
-            if for_block.filter_cond and not interpreter.eval(for_block.filter_cond):
-                continue
-            block_str = self._eval_blocks(for_block.statements, interpreter)
-            if block_str is not None:
-                if ret is None:
-                    ret = block_str
-                else:
-                    ret += os.linesep + block_str
+        outer_frame = self._frame
+        scope = for_block.scope
+        frame = Frame(scope, parent=outer_frame)
+        frame_values = frame.values
+        item_idx = scope.variables[item_var_name].index
+        is_first_idx = scope.variables["is_first"].index
+        is_last_idx = scope.variables["is_last"].index
+        filter_cond = for_block.filter_cond
 
-        self._set_ret_value(ret)
+        for item, is_first, is_last in iter_loop_items(items):
+            frame_values[item_idx] = item
+            frame_values[is_first_idx] = is_first
+            frame_values[is_last_idx] = is_last
+            self._frame = frame
+            try:
+                if filter_cond and not self._eval_expr(filter_cond):
+                    continue
+                block_str = self._eval_blocks(for_block.statements)
+            finally:
+                self._frame = outer_frame
+            if block_str is not None:
+                yield block_str
 
     def visit_assignment(self, assignment):
         value = self.eval(assignment.source)
         name = assignment.target.lexeme
-        self._env.set_value(name, value)
+        variable = assignment.variable
+        if variable is None:
+            self._env.set_value(name, value)
+        else:
+            frame = self._frame.display[variable.level]
+            frame.values[variable.index] = value
+            if frame.env is not None:
+                frame.env.set_value(name, value)
         self._set_ret_value("")
 
-    @staticmethod
-    def _eval_blocks(blocks, interpreter):
-        ret = None
+    def _eval_blocks(self, blocks):
+        # the first value which is not None is always kept,
+        # the following ones only if they are not empty
+        values = []
         for block in blocks:
-            block_value = interpreter.eval(block)
-            if block_value is not None:
-                if ret is None:
-                    ret = block_value
-                elif block_value:
-                    ret += os.linesep + block_value
-        return ret
+            block_value = self.eval(block)
+            if block_value is not None and (block_value or not values):
+                values.append(block_value)
+        return os.linesep.join(values) if values else None
 
     def visit_snippet(self, snippet):
         snippet_name = snippet.name.lexeme
-        self._env.set_value(snippet_name, snippet)
+        self._frame.set_value(snippet_name, snippet)
 
     def visit_snippet_call(self, snippet_call):
         snippet_name = snippet_call.name.lexeme
 
-        snippet = self._env.get_value(snippet_name)
-        if snippet is None:
+        snippet = self._lookup(snippet_call.variables, snippet_name)
+        if snippet is UNDEFINED:
             raise Exception(f"Unknown snippet {snippet_name}")
 
         num_args = len(snippet_call.args)
@@ -139,27 +164,50 @@ class Interpreter(BaseVisitor):
         if num_args != num_params:
             raise Exception(f"#args (={num_args}) does not match #params (={num_params})")
 
-        arg_values = [self.eval(arg) for arg in snippet_call.args]
-        snippet_env = Environment()
-        for i, param in enumerate(snippet.params):
-            snippet_env.set_value(param.lexeme, arg_values[i])
-
-        interpreter = Interpreter(snippet_env, self._template_exports)
-        ret = self._eval_blocks(snippet.statements, interpreter)
+        arg_values = [self._eval_expr(arg) for arg in snippet_call.args]
 
+        indent = None
         if snippet_call.indent:
             value_expr, unit = snippet_call.indent
             value = self.eval(value_expr)
             if not isinstance(value, int):
                 raise Exception("Indentation value must be an integer")
             indent = "\t" * value if unit == IndentationUnit.TABS else " " * value
+
+        key = None
+        if self._snippet_cache is not None:
+            key = self._snippet_cache.make_key(snippet, arg_values, indent)
+            if key is not None:
+                ret = self._snippet_cache.get(key)
+                if ret is not UNDEFINED:
+                    self._set_ret_value(ret)
+                    return
+
+        ret = self._eval_snippet(snippet, arg_values)
+
+        if indent is not None:
             ret = os.linesep.join([indent + line for line in ret.split(os.linesep)])
 
+        if key is not None:
+            self._snippet_cache.put(key, ret)
+
         self._set_ret_value(ret)
 
+    def _eval_snippet(self, snippet, arg_values):
+        snippet_frame = Frame(snippet.scope)
+        for i, param in enumerate(snippet.params):
+            snippet_frame.set_value(param.lexeme, arg_values[i])
+
+        outer_frame = self._frame
+        self._frame = snippet_frame
+        try:
+            return self._eval_blocks(snippet.statements)
+        finally:
+            self._frame = outer_frame
+
     def visit_call(self, func_call):
         callee = self.eval(func_call.callee)
-        arg_values = [self.eval(arg) for arg in func_call.args]
+        arg_values = [self._eval_expr(arg) for arg in func_call.args]
         self._set_ret_value(callee(*arg_values))
 
     def visit_use(self, use):
@@ -172,77 +220,85 @@ class Interpreter(BaseVisitor):
                 if name not in templ_exports:
                     raise Exception(f"'{name}' is not provided by '{templ_name}'")
                 if alias is None:
-                    self._env.set_value(name, templ_exports[name])
+                    self._frame.set_value(name, templ_exports[name])
                 else:
-                    self._env.set_value(alias, templ_exports[name])
+                    self._frame.set_value(alias, templ_exports[name])
         else:
             for name, ast in templ_exports.items():
-                self._env.set_value(name, ast)
+                self._frame.set_value(name, ast)
 
     def visit_expr(self, expr):
-        if isinstance(expr, String):
-            ret = expr.get_value().replace("\\'", "'")[1:-1]
-        elif isinstance(expr, SimpleValue):
-            ret = expr.get_value()
-        elif isinstance(expr, Identifier):
-            ret = self._eval_identifier(expr)
-        elif isinstance(expr, QualifiedName):
-            ret = self._eval_qualified_name(expr)
-        else:
+        evaluate = self._EXPR_EVALUATORS.get(expr.__class__)
+        if evaluate is None:
             raise Exception(f"Line {expr.token.line_num}: Unsupported expression {expr.token.lexeme}")
-        self._set_ret_value(ret)
+        self._set_ret_value(evaluate(self, expr))
 
     def visit_logical_bin(self, logical_bin):
-        left = self.eval(logical_bin.left)
+        left = self._eval_expr(logical_bin.left)
         op = logical_bin.op.lexeme
         if op == "or":
             if left:
                 self._set_ret_value(left)  # shortcut evaluation
                 return
-            self._set_ret_value(self.eval(logical_bin.right))
+            self._set_ret_value(self._eval_expr(logical_bin.right))
         elif op == "and":
             if not left:
                 self._set_ret_value(left)  # shortcut evaluation
                 return
-            self._set_ret_value(self.eval(logical_bin.right))
+            self._set_ret_value(self._eval_expr(logical_bin.right))
         else:
             raise Exception(f"Line {logical_bin.op.line_num}: Unknown operator {op}")
 
     def visit_logical_rel(self, logical_rel):
-        left = self.eval(logical_rel.left)
-        right = self.eval(logical_rel.right)
-        op = logical_rel.op.lexeme
-        ret = None
-        if op == "==":
-            ret = left == right
-        elif op == "<>":
-            ret = left != right
-        elif op == ">":
-            ret = left > right
-        elif op == ">=":
-            ret = left >= right
-        elif op == "<":
-            ret = left < right
-        elif op == "<=":
-            ret = left <= right
-        else:
-            raise Exception(f"Line {logical_rel.op.line_num}: Unknown operator {op}")
-        self._set_ret_value(ret)
+        left = self._eval_expr(logical_rel.left)
+        right = self._eval_expr(logical_rel.right)
+        op_func = logical_rel.op_func
+        if op_func is None:
+            op = logical_rel.op
+            raise Exception(f"Line {op.line_num}: Unknown operator {op.lexeme}")
+        self._set_ret_value(op_func(left, right))
 
     def visit_negation(self, negation):
-        ret = not self.eval(negation.expr)
+        ret = not self._eval_expr(negation.expr)
         self._set_ret_value(ret)
 
+    def _eval_literal(self, expr):
+        return expr.value
+
     def _eval_identifier(self, expr):
         name = expr.get_name()
-        value = self._env.get_value(name)
-        if value is None:
+        value = self._lookup(expr.variables, name)
+        if value is UNDEFINED:
             raise Exception(f"Line {expr.token.line_num}: Identifier {name} is not defined")
         return value
 
     def _eval_qualified_name(self, expr):
-        path = [tok.lexeme for tok in expr.identifier_tokens]
-        value = self._env.get_value(path[0])
-        for component in path[1:]:
-            value = getattr(value, component)
-        return value
+        value = self._lookup(expr.variables, expr.identifier_tokens[0].lexeme)
+        if value is UNDEFINED:
+            token = expr.identifier_tokens[0]
+            raise Exception(f"Line {token.line_num}: Identifier {token.lexeme} is not defined")
+        return expr.getter(value)
+
+    def _lookup(self, variables, name):
+        if variables is None:  # expression has not been resolved
+            return self._env.lookup(name)
+        display = self._frame.display
+        for variable in variables:
+            value = display[variable.level].values[variable.index]
+            if value is not UNDEFINED:
+                return value
+        return UNDEFINED
+
+    # evaluation of literals and names by class, see visit_expr and _eval_expr
+    _EXPR_EVALUATORS = {
+        Bool: _eval_literal,
+        String: _eval_literal,
+        Int: _eval_literal,
+        Real: _eval_literal,
+        Identifier: _eval_identifier,
+        QualifiedName: _eval_qualified_name
+    }
+
+
+def _no_value():
+    raise TypeError("Statement did not produce any value")
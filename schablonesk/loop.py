@@ -0,0 +1,34 @@
+
+def iter_loop_items(iterable):
+    # yields (item, is_first, is_last) for each item. is_last is determined
+    # by looking one item ahead, so lazy iterables are never materialized
+    iterator = iter(iterable)
+    try:
+        item = next(iterator)
+    except StopIteration:
+        return
+    is_first = True
+    for next_item in iterator:
+        yield item, is_first, False
+        item = next_item
+        is_first = False
+    yield item, is_first, True
+
+
+async def aiter_loop_items(iterable):
+    # async variant of iter_loop_items, accepts async and plain iterables
+    if not hasattr(iterable, "__aiter__"):
+        for entry in iter_loop_items(iterable):
+            yield entry
+        return
+    iterator = iterable.__aiter__()
+    try:
+        item = await iterator.__anext__()
+    except StopAsyncIteration:
+        return
+    is_first = True
+    async for next_item in iterator:
+        yield item, is_first, False
+        item = next_item
+        is_first = False
+    yield item, is_first, True
@@ -0,0 +1,223 @@
+import os
+from schablonesk.ast import *
+from schablonesk.token_category import TEXT, TRUE, FALSE
+from schablonesk.tokens import Token
+
+
+class Optimizer(BaseVisitor):
+    # Simplifies a resolved template AST without changing its output:
+    # expressions over literals are folded, cond branches which can never be
+    # taken are removed and adjacent static texts are merged. Nodes are
+    # replaced rather than modified, so cached ASTs are never shared in a
+    # half optimized state.
+
+    def __init__(self):
+        BaseVisitor.__init__(self)
+        self._stack = []
+
+    def optimize(self, template):
+        return self._optimize(template)
+
+    def _optimize(self, ast):
+        self._stack.append(ast)
+        ast.accept(self)
+        return self._stack.pop()
+
+    def _set_ret_value(self, value):
+        self._stack[-1] = value
+
+    def visit_template(self, templ):
+        ret = Template(templ.usages,
+                       [self._optimize(snippet) for snippet in templ.snippets],
+                       self._merge_template_texts([self._optimize(stmt) for stmt in templ.statements]))
+        ret.scope = templ.scope
+        self._set_ret_value(ret)
+
+    def visit_text(self, text):
+        parts = []
+        for part in text.parts:
+            if not isinstance(part, str):
+                part = self._optimize(part)
+                if is_constant(part):
+                    part = str(part.value)
+            if isinstance(part, str) and parts and isinstance(parts[-1], str):
+                parts[-1] += part
+            elif part != "":
+                parts.append(part)
+        if parts == list(text.parts):
+            return
+        if all(isinstance(part, str) for part in parts):
+            self._set_ret_value(_static_text(text.token, "".join(parts)))
+        else:
+            self._set_ret_value(Text(text.token, tuple(parts)))
+
+    def visit_block(self, block):
+        # a block only joins values which are not empty
+        statements = []
+        for stmt in block.statements:
+            stmt = self._optimize(stmt)
+            if _is_static(stmt):
+                if not _static_content(stmt):
+                    continue
+                if statements and _is_static(statements[-1]):
+                    statements[-1] = _join_static(statements[-1], stmt)
+                    continue
+            statements.append(stmt)
+        self._set_ret_value(Block(statements))
+
+    def visit_cond(self, cond_block):
+        branches = []
+        for condition, stmt in cond_block.branches:
+            condition = self._optimize(condition)
+            if is_constant(condition):
+                if not condition.value:
+                    continue
+                if not branches:
+                    # the first branch which can be taken is always taken
+                    self._set_ret_value(self._optimize(stmt))
+                    return
+                branches.append((condition, self._optimize(stmt)))
+                break
+            branches.append((condition, self._optimize(stmt)))
+        self._set_ret_value(CondBlock(branches))
+
+    def visit_for(self, for_block):
+        filter_cond = for_block.filter_cond
+        if filter_cond is not None:
+            filter_cond = self._optimize(filter_cond)
+            if is_constant(filter_cond) and filter_cond.value:
+                filter_cond = None
+        ret = ForBlock(for_block.item_ident, self._optimize(for_block.list_expr),
+                       self._merge_block_texts([self._optimize(stmt) for stmt in for_block.statements]),
+                       filter_cond)
+        ret.scope = for_block.scope
+        self._set_ret_value(ret)
+
+    def visit_snippet(self, snippet):
+        ret = Snippet(snippet.name, snippet.params,
+                      self._merge_block_texts([self._optimize(stmt) for stmt in snippet.statements]))
+        ret.scope = snippet.scope
+        ret.template_name = snippet.template_name
+        self._set_ret_value(ret)
+
+    def visit_snippet_call(self, snippet_call):
+        indent = snippet_call.indent
+        if indent:
+            value_expr, unit = indent
+            indent = (self._optimize(value_expr), unit)
+        ret = SnippetCall(snippet_call.name, [self._optimize(arg) for arg in snippet_call.args], indent)
+        ret.variables = snippet_call.variables
+        self._set_ret_value(ret)
+
+    def visit_assignment(self, assignment):
+        ret = Assignment(self._optimize(assignment.source), assignment.target)
+        ret.variable = assignment.variable
+        self._set_ret_value(ret)
+
+    def visit_call(self, func_call):
+        self._set_ret_value(Call(self._optimize(func_call.callee),
+                                 [self._optimize(arg) for arg in func_call.args]))
+
+    def visit_logical_bin(self, logical_bin):
+        left = self._optimize(logical_bin.left)
+        right = self._optimize(logical_bin.right)
+        op = logical_bin.op.lexeme
+        if is_constant(left) and op in ("or", "and"):
+            # same shortcut evaluation as the interpreter
+            if bool(left.value) == (op == "or"):
+                self._set_ret_value(left)
+            else:
+                self._set_ret_value(right)
+            return
+        self._set_ret_value(LogicalBinExpr(logical_bin.op, left, right))
+
+    def visit_logical_rel(self, logical_rel):
+        left = self._optimize(logical_rel.left)
+        right = self._optimize(logical_rel.right)
+        if is_constant(left) and is_constant(right) and logical_rel.op_func is not None:
+            try:
+                value = logical_rel.op_func(left.value, right.value)
+            except TypeError:
+                pass  # e.g. 1 < 'a', the error is raised when rendering
+            else:
+                self._set_ret_value(_bool(value, logical_rel.op.line_num))
+                return
+        self._set_ret_value(LogicalRelation(logical_rel.op, left, right))
+
+    def visit_negation(self, negation):
+        expr = self._optimize(negation.expr)
+        if is_constant(expr):
+            self._set_ret_value(_bool(not expr.value, _get_line_num(expr)))
+        else:
+            self._set_ret_value(Negation(expr))
+
+    @staticmethod
+    def _merge_template_texts(statements):
+        # The template puts a line separator in front of every value once a
+        # value was not empty. Two static texts can be merged if the first one
+        # is not empty or starts the output.
+        ret = []
+        for stmt in statements:
+            if _is_static(stmt) and ret and _is_static(ret[-1]):
+                prev = ret[-1]
+                if _static_content(prev):
+                    ret[-1] = _static_text(prev.token, _static_content(prev) + os.linesep + _static_content(stmt))
+                    continue
+                if len(ret) == 1:
+                    ret[-1] = stmt
+                    continue
+            ret.append(stmt)
+        return ret
+
+    @staticmethod
+    def _merge_block_texts(statements):
+        # Loop and snippet bodies keep the first value which is not None and
+        # append the following ones if they are not empty (see
+        # Interpreter._eval_blocks). Static texts are never None.
+        ret = []
+        for stmt in statements:
+            if _is_static(stmt) and ret and _is_static(ret[-1]):
+                prev = ret[-1]
+                if not _static_content(stmt):
+                    continue
+                if _static_content(prev) or len(ret) == 1:
+                    ret[-1] = _join_static(prev, stmt)
+                    continue
+            ret.append(stmt)
+        return ret
+
+
+def optimize(template):
+    return Optimizer().optimize(template)
+
+
+def is_constant(expr):
+    return isinstance(expr, SimpleValue)
+
+
+def _bool(value, line_num):
+    return Bool(Token(TRUE, "true", line_num) if value else Token(FALSE, "false", line_num))
+
+
+def _get_line_num(expr):
+    return expr.token.line_num if isinstance(expr, SingleToken) else None
+
+
+def _is_static(stmt):
+    return isinstance(stmt, Text) and all(isinstance(part, str) for part in stmt.parts)
+
+
+def _static_content(text):
+    return "".join(text.parts)
+
+
+def _static_text(token, content):
+    return Text(Token(TEXT, content, token.line_num), (content,) if content else ())
+
+
+def _join_static(first, second):
+    content = _static_content(first)
+    second_content = _static_content(second)
+    if second_content:
+        content += os.linesep + second_content
+    return _static_text(first.token, content)
@@ -0,0 +1,343 @@
+import codecs
+import json
+import marshal
+import mmap
+import os
+import pickle
+import re
+
+
+# Template parameters from files. The format is chosen by name or by the
+# file extension, further formats can be added by register_format.
+#
+# In streaming mode arrays on the top level of JSON files are not decoded
+# when loading, they become LazyJsonArray objects which decode one item at
+# a time while a for loop iterates them. JSON Lines files and files with an
+# array or list on the top level provide their items as a single parameter.
+
+_CHUNK_SIZE = 1 << 16
+_NON_WHITESPACE = re.compile(r"[^ \t\n\r]")
+_DELIMITER = re.compile(r"[ \t\n\r,:\]}]")
+_decoder = json.JSONDecoder()
+
+_BINARY_MAGIC = b"SCHB\x01"
+_MARSHAL_VERSION = 4
+
+
+class ParamsFormat(object):
+
+    # load(params_file, streaming, use_mmap, items_name) returns the params
+    # dict, dump(params, params_file, items_name) writes it (optional)
+
+    def __init__(self, name, load, dump=None, extensions=()):
+        self.name = name
+        self.load = load
+        self.dump = dump
+        self.extensions = extensions
+
+
+_formats = {}
+
+
+def register_format(params_format):
+    _formats[params_format.name] = params_format
+
+
+def get_format(name):
+    params_format = _formats.get(name)
+    if params_format is None:
+        raise Exception(f"Unknown params format '{name}'")
+    return params_format
+
+
+def get_format_names():
+    return sorted(_formats)
+
+
+def find_format(params_file):
+    # by file extension, JSON is the default
+    extension = os.path.splitext(params_file)[1].lower()
+    for params_format in _formats.values():
+        if extension in params_format.extensions:
+            return params_format
+    return _formats["json"]
+
+
+def load_params(params_file, streaming=False, use_mmap=False, items_name="items", params_format=None):
+    params_format = get_format(params_format) if params_format is not None else find_format(params_file)
+    return params_format.load(params_file, streaming, use_mmap, items_name)
+
+
+def dump_params(params, params_file, params_format=None, items_name="items"):
+    params_format = get_format(params_format) if params_format is not None else find_format(params_file)
+    if params_format.dump is None:
+        raise Exception(f"Params cannot be written in format '{params_format.name}'")
+    params_format.dump(params, params_file, items_name)
+
+
+def _as_params(value, items_name):
+    return value if isinstance(value, dict) else {items_name: value}
+
+
+def _load_json(params_file, streaming, use_mmap, items_name):
+    if streaming or use_mmap:
+        source = _MappedSource(params_file) if use_mmap else _FileSource(params_file)
+        return _read_object(source, items_name)
+    with open(params_file, "r") as f:
+        return _as_params(json.load(f), items_name)
+
+
+def _dump_json(params, params_file, items_name):
+    with open(params_file, "w") as f:
+        json.dump(params, f)
+
+
+def _load_json_lines(params_file, streaming, use_mmap, items_name):
+    if streaming or use_mmap:
+        source = _MappedSource(params_file) if use_mmap else _FileSource(params_file)
+        return {items_name: LazyJsonLines(source)}
+    with open(params_file, "r") as f:
+        lines = [line for line in f if line.strip()]
+    # one decoder call for all lines is faster than one per line
+    return {items_name: json.loads("[" + ",".join(lines) + "]")}
+
+
+def _dump_json_lines(params, params_file, items_name):
+    # checked first, so no empty file is left behind
+    if items_name not in params:
+        raise Exception(f"JSON Lines params need the items in parameter '{items_name}'")
+    with open(params_file, "w") as f:
+        for item in params[items_name]:
+            f.write(json.dumps(item) + "\n")
+
+
+def _load_pickle(params_file, streaming, use_mmap, items_name):
+    # only for trusted files, unpickling can run arbitrary code
+    with open(params_file, "rb") as f:
+        return _as_params(pickle.load(f), items_name)
+
+
+def _dump_pickle(params, params_file, items_name):
+    with open(params_file, "wb") as f:
+        pickle.dump(_share_values(params, {}), f, pickle.HIGHEST_PROTOCOL)
+
+
+def _load_binary(params_file, streaming, use_mmap, items_name):
+    # Header and marshal data of JSON like values, equal strings are stored
+    # once. Decoding runs in C like json and pickle but needs no parsing.
+    # Only for trusted files written by the same Python version, marshal
+    # does not guard against malformed data and its format may change.
+    with open(params_file, "rb") as f:
+        if use_mmap:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _as_params(_unmarshal(data, params_file), items_name)
+        return _as_params(_unmarshal(f.read(), params_file), items_name)
+
+
+def _unmarshal(data, params_file):
+    if data[:len(_BINARY_MAGIC)] != _BINARY_MAGIC:
+        raise Exception(f"{params_file} is not a binary params file")
+    with memoryview(data)[len(_BINARY_MAGIC):] as view:
+        return marshal.loads(view)
+
+
+def _dump_binary(params, params_file, items_name):
+    with open(params_file, "wb") as f:
+        f.write(_BINARY_MAGIC)
+        marshal.dump(_share_values(params, {}), f, _MARSHAL_VERSION)
+
+
+def _share_values(value, strings):
+    # equal strings become the same object, which is written only once
+    if isinstance(value, str):
+        return strings.setdefault(value, value)
+    if isinstance(value, dict):
+        return dict([(_share_values(key, strings), _share_values(item, strings))
+                     for key, item in value.items()])
+    if isinstance(value, (list, tuple)):
+        return [_share_values(item, strings) for item in value]
+    return value
+
+
+register_format(ParamsFormat("json", _load_json, _dump_json, (".json",)))
+register_format(ParamsFormat("jsonl", _load_json_lines, _dump_json_lines, (".jsonl", ".ndjson")))
+register_format(ParamsFormat("pickle", _load_pickle, _dump_pickle, (".pickle", ".pkl")))
+register_format(ParamsFormat("binary", _load_binary, _dump_binary, (".schb",)))
+
+
+class LazyJsonArray(object):
+
+    # Array starting at byte offset pos of a JSON file. Every iteration reads
+    # the file again, so nested loops over the same array work as expected.
+
+    def __init__(self, source, pos):
+        self._source = source
+        self._pos = pos
+
+    def __iter__(self):
+        f = self._source.open()
+        try:
+            yield from _JsonReader(f, self._pos).array_items()
+        finally:
+            f.close()
+
+
+class LazyJsonLines(object):
+
+    def __init__(self, source):
+        self._source = source
+
+    def __iter__(self):
+        f = self._source.open()
+        try:
+            reader = _JsonReader(f)
+            while reader.peek():
+                yield reader.value()
+        finally:
+            f.close()
+
+
+def _read_object(source, items_name):
+    f = source.open()
+    try:
+        reader = _JsonReader(f)
+        if reader.peek() == "[":
+            return {items_name: LazyJsonArray(source, reader.position())}
+        ret = {}
+        reader.expect("{")
+        if reader.peek() == "}":
+            return ret
+        while True:
+            name = reader.value()
+            if not isinstance(name, str):
+                reader.error("expected a property name")
+            reader.expect(":")
+            if reader.peek() == "[":
+                ret[name] = LazyJsonArray(source, reader.position())
+                for _ in reader.array_items():
+                    pass  # skipped, the items are decoded when iterating
+            else:
+                ret[name] = reader.value()
+            if reader.peek() == "}":
+                return ret
+            reader.expect(",")
+    finally:
+        f.close()
+
+
+class _JsonReader(object):
+
+    # Decodes JSON values one after another from a binary file. Decoded text
+    # is kept in a buffer which is refilled when a value reaches its end.
+
+    def __init__(self, f, pos=0):
+        f.seek(pos)
+        self._file = f
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._text = ""
+        self._idx = 0
+        self._text_pos = pos  # byte offset of self._text[0]
+        self._eof = False
+
+    def position(self):
+        # byte offset of the next character
+        return self._text_pos + len(self._text[:self._idx].encode("utf-8"))
+
+    def peek(self):
+        # next character which is not whitespace, "" at the end of the file
+        while True:
+            match = _NON_WHITESPACE.search(self._text, self._idx)
+            if match is not None:
+                self._idx = match.start()
+                return self._text[self._idx]
+            self._idx = len(self._text)
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            self.error(f"expected '{char}'")
+        self._idx += 1
+
+    def error(self, message):
+        raise Exception(f"Invalid JSON params at byte {self.position()}: {message}")
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._text, self._idx)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # a number at the end of the buffer may go on, e.g. 1.5 of 1.5e3
+            if _DELIMITER.search(self._text, end) is None and self._fill():
+                continue
+            self._idx = end
+            return value
+
+    def array_items(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self._idx += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == "]":
+                self._idx += 1
+                return
+            self.expect(",")
+
+    def _fill(self):
+        if self._eof:
+            return False
+        # values longer than the buffer double the read size
+        data = self._file.read(max(_CHUNK_SIZE, len(self._text) - self._idx))
+        self._eof = not data
+        self._text_pos += len(self._text[:self._idx].encode("utf-8"))
+        self._text = self._text[self._idx:] + self._decoder.decode(data, self._eof)
+        self._idx = 0
+        return not self._eof
+
+
+class _FileSource(object):
+
+    def __init__(self, path):
+        self._path = path
+
+    def open(self):
+        return open(self._path, "rb")
+
+
+class _MappedSource(object):
+
+    # All readers share one read-only mapping of the file
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty files cannot be mapped
+                self._mmap = b""
+
+    def open(self):
+        return _MappedFile(self._mmap)
+
+
+class _MappedFile(object):
+
+    def __init__(self, data):
+        self._data = data
+        self._pos = 0
+
+    def seek(self, pos):
+        self._pos = pos
+
+    def read(self, size):
+        ret = self._data[self._pos:self._pos + size]
+        self._pos += len(ret)
+        return ret
+
+    def close(self):
+        pass
@@ -1,11 +1,16 @@
+import os
 from schablonesk.ast import *
 from schablonesk.token_category import *
+from schablonesk.config import Config
+from schablonesk.scanner import Scanner
+from schablonesk.resolver import Resolver
 
 
 class Parser(object):
 
-    def __init__(self, tokens):
+    def __init__(self, tokens, config=None):
         self._tokens = tokens
+        self._config = config if config is not None else Config.get()
         self._next_idx = 0
         self._end_idx = len(self._tokens) - 1
 
@@ -13,6 +18,7 @@ class Parser(object):
         ret = self._template()
         if not self._end_of_tokens():
             raise Exception("Unexpected end of parse")
+        Resolver().resolve(ret)
         return ret
 
     def parse_expr(self):
@@ -38,7 +44,8 @@ class Parser(object):
 
     def _statement(self):
         if self._match(TEXT):
-            return Text(self._consume())
+            text_token = self._consume()
+            return Text(text_token, self._text_parts(text_token, self._config))
         if self._match(COND):
             return self._cond_block()
         if self._match(FOR):
@@ -49,6 +56,40 @@ class Parser(object):
             return self._block()
         return self._assignment()
 
+    @staticmethod
+    def _text_parts(text_token, config):
+        begin, end = config.get_templ_str_delimiters()
+        cmd_line_begin = config.get_cmd_line_begin()
+        content = text_token.lexeme
+        parts = []
+        search_pos = 0
+        while True:
+            pos = content.find(begin, search_pos)
+            if pos != -1:
+                parts.append(content[search_pos:pos])
+                search_pos = pos + len(begin)
+                pos = content.find(end, search_pos)
+                if pos != -1:
+                    expr_str = cmd_line_begin + content[search_pos:pos]
+                    tokens = Scanner(config).scan(expr_str)
+                    line_num = text_token.line_num + content.count(os.linesep, 0, search_pos)
+                    for token in tokens:
+                        token.line_num = line_num
+                    # errors are reported when parsing, also for texts which
+                    # are never rendered, like errors of command lines
+                    try:
+                        parts.append(Parser(tokens, config).parse_expr())
+                    except Exception as e:
+                        raise Exception(f"Line {line_num}: Invalid expression {content[search_pos:pos]!r}: {e}")
+                    search_pos = pos + len(end)
+                else:
+                    parts.append(content[search_pos:])
+                    break
+            else:
+                parts.append(content[search_pos:])
+                break
+        return tuple([part for part in parts if part != ""])
+
     def _block(self):
         statements = []
         self._consume(BLOCK)
@@ -218,7 +259,7 @@ class Parser(object):
         if len(identifier_tokens) == 1:
             name = Identifier(identifier_tokens[0])
         else:
-            name = QualifiedName(identifier_tokens)
+            name = QualifiedName(tuple(identifier_tokens), self._config.get_dict_access())
         if not self._match(LPAR):
             return name
         # function or method call
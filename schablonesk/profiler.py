@@ -0,0 +1,135 @@
+import os
+import time
+from schablonesk.ast import *
+from schablonesk.interpreter import Interpreter
+from schablonesk.template_exports import TemplateExports
+
+
+class NodeStats(object):
+
+    def __init__(self):
+        self.calls = 0
+        self.cumulative_time = 0.0
+        self.output_bytes = 0
+
+
+class Profiler(object):
+
+    # Collects call count, cumulative time and output size of statements and
+    # function calls, keyed by (template name, snippet name, line, node kind).
+    # Self times along the stack of nodes are collected as collapsed stacks
+    # for flamegraph.pl and compatible tools.
+
+    def __init__(self):
+        self.stats = {}
+        self._stack = []
+        self._collapsed = {}
+
+    def begin(self, key):
+        self._stack.append([key, 0.0])
+
+    def end(self, key, elapsed, value):
+        _, child_time = self._stack.pop()
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = NodeStats()
+        stats.calls += 1
+        stats.cumulative_time += elapsed
+        if isinstance(value, str):
+            stats.output_bytes += len(value.encode("utf-8"))
+
+        path = ";".join([self._label(k) for k, _ in self._stack] + [self._label(key)])
+        self._collapsed[path] = self._collapsed.get(path, 0.0) + elapsed - child_time
+        if self._stack:
+            self._stack[-1][1] += elapsed
+
+    def report(self, limit=None):
+        entries = sorted(self.stats.items(), key=lambda item: item[1].cumulative_time, reverse=True)
+        if limit is not None:
+            entries = entries[:limit]
+        lines = [f"{'cum. time [s]':>14} {'calls':>10} {'bytes':>12}  location"]
+        for key, stats in entries:
+            lines.append(f"{stats.cumulative_time:14.6f} {stats.calls:10d} {stats.output_bytes:12d}  {self._label(key)}")
+        return os.linesep.join(lines)
+
+    def write_collapsed(self, fileobj):
+        # one line per stack, the value is the self time in microseconds
+        for path, self_time in self._collapsed.items():
+            fileobj.write(f"{path} {int(round(self_time * 1e6))}\n")
+
+    @staticmethod
+    def _label(key):
+        template_name, snippet_name, line_num, kind = key
+        location = template_name or "<template>"
+        if snippet_name is not None:
+            location += f":{snippet_name}"
+        return f"{location}:{line_num} ({kind})"
+
+
+class ProfilingInterpreter(Interpreter):
+
+    _PROFILED_NODES = {
+        Text: "text",
+        Block: "block",
+        CondBlock: "cond",
+        ForBlock: "for",
+        SnippetCall: "paste",
+        Assignment: "assignment",
+        Call: "call"
+    }
+
+    def __init__(self, environment, template_exports=TemplateExports([os.curdir]), snippet_cache=None,
+                 profiler=None, template_name=None):
+        Interpreter.__init__(self, environment, template_exports, snippet_cache)
+        self.profiler = profiler if profiler is not None else Profiler()
+        self._location = (template_name, None)
+        self._keys = {}
+
+    def eval(self, ast):
+        kind = self._PROFILED_NODES.get(type(ast))
+        if kind is None:
+            return Interpreter.eval(self, ast)
+        key = self._keys.get((ast, self._location))
+        if key is None:
+            key = self._keys[(ast, self._location)] = self._location + (get_line_num(ast), kind)
+        value = None
+        self.profiler.begin(key)
+        start = time.perf_counter()
+        try:
+            value = Interpreter.eval(self, ast)
+            return value
+        finally:
+            self.profiler.end(key, time.perf_counter() - start, value)
+
+    def _eval_snippet(self, snippet, arg_values):
+        outer_location = self._location
+        self._location = (snippet.template_name or outer_location[0], snippet.name.lexeme)
+        try:
+            return Interpreter._eval_snippet(self, snippet, arg_values)
+        finally:
+            self._location = outer_location
+
+
+def get_line_num(node):
+    # line of the first token of a node
+    if isinstance(node, (Text, SingleToken)):
+        return node.token.line_num
+    if isinstance(node, QualifiedName):
+        return node.identifier_tokens[0].line_num
+    if isinstance(node, SnippetCall):
+        return node.name.line_num
+    if isinstance(node, Assignment):
+        return node.target.line_num
+    if isinstance(node, ForBlock):
+        return node.item_ident.token.line_num
+    if isinstance(node, CondBlock):
+        return get_line_num(node.branches[0][0]) if node.branches else None
+    if isinstance(node, Block):
+        return get_line_num(node.statements[0]) if node.statements else None
+    if isinstance(node, Call):
+        return get_line_num(node.callee)
+    if isinstance(node, (LogicalBinExpr, LogicalRelation)):
+        return get_line_num(node.left)
+    if isinstance(node, Negation):
+        return get_line_num(node.expr)
+    return None
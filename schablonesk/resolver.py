@@ -0,0 +1,163 @@
+from schablonesk.ast import *
+
+
+class Variable(object):
+
+    __slots__ = ("name", "level", "index", "definite")
+
+    def __init__(self, name, level, index, definite=False):
+        self.name = name
+        self.level = level  # nesting level of the declaring scope
+        self.index = index  # slot index within frames of the declaring scope
+        self.definite = definite  # always set when the scope is entered
+
+
+class Scope(object):
+
+    __slots__ = ("parent", "level", "variables")
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.level = parent.level + 1 if parent is not None else 0
+        self.variables = {}
+
+    def declare(self, name, definite=False):
+        variable = self.variables.get(name)
+        if variable is None:
+            variable = Variable(name, self.level, len(self.variables), definite)
+            self.variables[name] = variable
+        elif definite:
+            variable.definite = True
+        return variable
+
+    def resolve(self, name):
+        # Returns all variables that can hold the value of name at runtime,
+        # innermost first. Unknown names are declared in the root scope where
+        # they can be provided by template parameters.
+        candidates = []
+        scope = self
+        while scope is not None:
+            variable = scope.variables.get(name)
+            if variable is None and scope.parent is None:
+                variable = scope.declare(name)
+            if variable is not None:
+                candidates.append(variable)
+                if variable.definite:
+                    break
+            scope = scope.parent
+        return tuple(candidates)
+
+
+class Resolver(BaseVisitor):
+
+    def __init__(self):
+        BaseVisitor.__init__(self)
+        self._scope = None
+        self._candidates = {}
+
+    def resolve(self, template):
+        template.accept(self)
+
+    def visit_template(self, templ):
+        self._scope = templ.scope = Scope()
+        for usage in templ.usages:
+            usage.accept(self)
+        for snippet in templ.snippets:
+            snippet.accept(self)
+        for stmt in templ.statements:
+            stmt.accept(self)
+        self._scope = None
+
+    def visit_use(self, use):
+        for (name_id, alias_id) in use.names:
+            self._scope.declare(alias_id is not None and alias_id.lexeme or name_id.lexeme)
+
+    def visit_snippet(self, snippet):
+        self._scope.declare(snippet.name.lexeme)
+        outer_scope = self._scope
+        self._scope = snippet.scope = Scope()
+        for param in snippet.params:
+            self._scope.declare(param.lexeme, definite=True)
+        self._declare_assignments(snippet.statements)
+        for stmt in snippet.statements:
+            stmt.accept(self)
+        self._scope = outer_scope
+
+    def visit_text(self, text):
+        for part in text.parts:
+            if not isinstance(part, str):
+                part.accept(self)
+
+    def visit_block(self, block):
+        for stmt in block.statements:
+            stmt.accept(self)
+
+    def visit_cond(self, cond_block):
+        for condition, stmt in cond_block.branches:
+            condition.accept(self)
+            stmt.accept(self)
+
+    def visit_for(self, for_block):
+        for_block.list_expr.accept(self)
+        outer_scope = self._scope
+        self._scope = for_block.scope = Scope(outer_scope)
+        for_block.item_ident.variables = (
+            self._scope.declare(for_block.item_ident.get_name(), definite=True),
+        )
+        self._scope.declare("is_first", definite=True)
+        self._scope.declare("is_last", definite=True)
+        self._declare_assignments(for_block.statements)
+        if for_block.filter_cond:
+            for_block.filter_cond.accept(self)
+        for stmt in for_block.statements:
+            stmt.accept(self)
+        self._scope = outer_scope
+
+    def visit_assignment(self, assignment):
+        assignment.source.accept(self)
+        assignment.variable = self._scope.declare(assignment.target.lexeme)
+
+    def visit_snippet_call(self, snippet_call):
+        snippet_call.variables = self._resolve(snippet_call.name.lexeme)
+        for arg in snippet_call.args:
+            arg.accept(self)
+        if snippet_call.indent:
+            snippet_call.indent[0].accept(self)
+
+    def visit_call(self, func_call):
+        func_call.callee.accept(self)
+        for arg in func_call.args:
+            arg.accept(self)
+
+    def visit_expr(self, expr):
+        if isinstance(expr, Identifier):
+            expr.variables = self._resolve(expr.get_name())
+        elif isinstance(expr, QualifiedName):
+            expr.variables = self._resolve(expr.identifier_tokens[0].lexeme)
+
+    def _resolve(self, name):
+        # equal candidate tuples are shared to keep cached templates small
+        candidates = self._scope.resolve(name)
+        return self._candidates.setdefault(candidates, candidates)
+
+    def visit_logical_bin(self, logical_bin):
+        logical_bin.left.accept(self)
+        logical_bin.right.accept(self)
+
+    def visit_logical_rel(self, logical_rel):
+        logical_rel.left.accept(self)
+        logical_rel.right.accept(self)
+
+    def visit_negation(self, negation):
+        negation.expr.accept(self)
+
+    def _declare_assignments(self, statements):
+        # Assignments store their values in the innermost loop or snippet,
+        # so they are declared before any name of the scope is resolved
+        for stmt in statements:
+            if isinstance(stmt, Assignment):
+                self._scope.declare(stmt.target.lexeme)
+            elif isinstance(stmt, Block):
+                self._declare_assignments(stmt.statements)
+            elif isinstance(stmt, CondBlock):
+                self._declare_assignments([block for _, block in stmt.branches])
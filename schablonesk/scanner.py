@@ -1,5 +1,6 @@
 import os
 import re
+import sys
 from schablonesk.tokens import Token
 from schablonesk.token_category import *
 from schablonesk.config import Config
@@ -7,9 +8,21 @@ from schablonesk.config import Config
 
 class Scanner:
 
-    def __init__(self):
-        pattern = Config.get().get_cmd_line_begin()
-        self.cmd_line_begin = re.compile("^\\s*" + pattern + "(.+)")
+    _cmd_line_regexes = {}
+
+    def __init__(self, config=None):
+        if config is None:
+            config = Config.get()
+        self.cmd_line_begin = self._get_cmd_line_regex(config.get_cmd_line_begin())
+
+    @classmethod
+    def _get_cmd_line_regex(cls, pattern):
+        regex = cls._cmd_line_regexes.get(pattern)
+        if regex is None:
+            # compiling twice in concurrent threads is harmless
+            regex = re.compile("^\\s*" + pattern + "(.+)")
+            cls._cmd_line_regexes[pattern] = regex
+        return regex
 
     def scan(self, code):
         ret = []
@@ -50,51 +63,71 @@ class Scanner:
 
 class _CommandBlock:
 
+    # Alternatives are ordered so that the first match is the longest one
+    # (e.g. REAL before INT, GE before GT)
+    token_regex = re.compile("|".join([
+        "(?P<REAL>\\d+\\.\\d*)",
+        "(?P<INT>\\d+)",
+        r"(?P<STRING>'(?:\\'|[^'])*')",
+        "(?P<IDENTIFIER>[a-z_][a-z0-9_]*)",
+        "(?P<EQ>==)",
+        "(?P<NE><>)",
+        "(?P<GE>>=)",
+        "(?P<GT>>)",
+        "(?P<LE><=)",
+        "(?P<LARROW><-)",
+        "(?P<LT><)",
+        "(?P<RARROW>->)",
+        "(?P<LPAR>\\()",
+        "(?P<RPAR>\\))",
+        "(?P<DOT>\\.)"
+    ]))
+    whitespace = re.compile("\\s*")
+    categories = {
+        "REAL": REAL,
+        "INT": INT,
+        "STRING": STRING,
+        "IDENTIFIER": IDENTIFIER,
+        "EQ": EQ,
+        "NE": NE,
+        "GE": GE,
+        "GT": GT,
+        "LE": LE,
+        "LARROW": LARROW,
+        "LT": LT,
+        "RARROW": RARROW,
+        "LPAR": LPAR,
+        "RPAR": RPAR,
+        "DOT": DOT
+    }
+    keywords = {
+        "cond": COND,
+        "else": ELSE,
+        "endcond": ENDCOND,
+        "for": FOR,
+        "in": IN,
+        "where": WHERE,
+        "endfor": ENDFOR,
+        "and": AND,
+        "or": OR,
+        "not": NOT,
+        "true": TRUE,
+        "false": FALSE,
+        "snippet": SNIPPET,
+        "endsnippet": ENDSNIPPET,
+        "paste": PASTE,
+        "use": USE,
+        "from": FROM,
+        "indent": INDENT,
+        "by": BY,
+        "tabs": TABS,
+        "spaces": SPACES,
+        "block": BLOCK,
+        "endblock": ENDBLOCK
+    }
+
     def __init__(self):
         self.lines = []
-        self.patterns = [
-            (re.compile("\\."), DOT),
-            (re.compile("=="), EQ),
-            (re.compile("<>"), NE),
-            (re.compile(">"), GT),
-            (re.compile(">="), GE),
-            (re.compile("<"), LT),
-            (re.compile("<="), LE),
-            (re.compile("<-"), LARROW),
-            (re.compile("->"), RARROW),
-            (re.compile("\\("), LPAR),
-            (re.compile("\\)"), RPAR),
-            (re.compile("^[a-z_][a-z0-9_]*"), IDENTIFIER),
-            (re.compile(r"'(\\'|[^'])*'"), STRING),
-            (re.compile("\\d+"), INT),
-            (re.compile("\\d+\\.\\d*"), REAL)
-        ]
-        self.whitespace = re.compile("^\\s+")
-        self.keywords = {
-            "cond": COND,
-            "else": ELSE,
-            "endcond": ENDCOND,
-            "for": FOR,
-            "in": IN,
-            "where": WHERE,
-            "endfor": ENDFOR,
-            "and": AND,
-            "or": OR,
-            "not": NOT,
-            "true": TRUE,
-            "false": FALSE,
-            "snippet": SNIPPET,
-            "endsnippet": ENDSNIPPET,
-            "paste": PASTE,
-            "use": USE,
-            "from": FROM,
-            "indent": INDENT,
-            "by": BY,
-            "tabs": TABS,
-            "spaces": SPACES,
-            "block": BLOCK,
-            "endblock": ENDBLOCK
-        }
 
     def add(self, line_num, commands):
         self.lines.append((line_num, commands))
@@ -107,43 +140,27 @@ class _CommandBlock:
 
     def _tokenize_commands(self, line_num, commands):
         tokens = []
-        remaining = commands
-        while remaining:
-            token, remaining = self.match_next(remaining, line_num)
-            if token is not None:
-                tokens.append(token)
+        pos = 0
+        end = len(commands)
+        while True:
+            pos = self.whitespace.match(commands, pos).end()
+            if pos >= end:
+                break
+            token, pos = self.match_next(commands, pos, line_num)
+            tokens.append(token)
         return tokens
 
-    def match_next(self, s, line_num):
-        remaining = s
-
-        # Skip whitespace
-        match_res = self.whitespace.match(remaining)
-
+    def match_next(self, s, pos, line_num):
+        match_res = self.token_regex.match(s, pos)
         if match_res:
-            remaining = remaining[match_res.end():]
-        if not remaining:
-            return None, remaining
-
-        # Find maximal munch:
-        max_token_catg = None
-        max_size = 0
-        for regex, token_catg in self.patterns:
-            match_res = regex.match(remaining)
-            if match_res:
-                size = match_res.end()
-                if max_token_catg is None or size > max_size:
-                    max_token_catg = token_catg
-                    max_size = size
-        if max_token_catg:
-            lexeme = remaining[:max_size]
+            # lexemes of commands repeat a lot, so equal ones share one string
+            lexeme = sys.intern(match_res.group())
+            token_catg = self.categories[match_res.lastgroup]
             # Check for keywords:
-            max_token_catg = self.adapt_token_catg(max_token_catg, lexeme)
-            return Token(max_token_catg,
-                         lexeme,
-                         line_num), remaining[max_size:]
+            token_catg = self.adapt_token_catg(token_catg, lexeme)
+            return Token(token_catg, lexeme, line_num), match_res.end()
         else:
-            return Token(UNKNOWN, remaining, line_num), ""
+            return Token(UNKNOWN, s[pos:], line_num), len(s)
 
     def adapt_token_catg(self, token_catg, lexeme):
         if token_catg != IDENTIFIER or lexeme not in self.keywords:
@@ -155,14 +172,13 @@ class _CommandBlock:
 class _TextBlock:
 
     def __init__(self, start_line_num):
-        self.text = ""
+        self.lines = []
         self.start_line_num = start_line_num
 
     def add_text_line(self, line):
-        if self.text:
-            self.text += os.linesep + line
-        else:
-            self.text = line
+        # leading empty lines are skipped
+        if line or self.lines:
+            self.lines.append(line)
 
     def tokenize(self):
-        return [Token(TEXT, self.text, self.start_line_num)]
+        return [Token(TEXT, os.linesep.join(self.lines), self.start_line_num)]
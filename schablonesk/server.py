@@ -0,0 +1,239 @@
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import threading
+from schablonesk import CodeGenerator
+from schablonesk.batch import write_output
+from schablonesk.config import Config
+from schablonesk.params import find_format, get_format, load_params
+from schablonesk.watch import FileWatcher
+
+
+# Render server for build systems which run schablonesk-cli very often.
+# Messages are JSON objects sent as a 4 byte big endian length followed by
+# the UTF-8 encoded JSON. Several requests can be sent over one connection.
+# A request holds
+#
+#   template       path of the template file
+#   params         params object, or
+#   params_file    path of a params file, read with params_format,
+#                  stream_params, mmap and items_name as by load_params
+#   output         path of the output file (optional)
+#   dict_access    see Config (optional)
+#
+# The response is {"ok": true, "output": text}, text is None if an output
+# file was given, or {"ok": false, "error": message}. Relative paths are
+# resolved by the server, so clients should send absolute paths.
+#
+# Clients read files and render templates with the rights of the server.
+# The socket is therefore only accessible by the user running the server
+# (mode 0600), and params files in formats which may run code on loading
+# (pickle) are refused.
+
+_HEADER = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 1 << 30
+UNSAFE_PARAMS_FORMATS = ("pickle",)
+
+
+def send_message(sock, message):
+    data = json.dumps(message).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def recv_message(sock):
+    # None if the connection was closed before the next message
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    size, = _HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise Exception(f"Message of {size} bytes is too large")
+    data = _recv_exactly(sock, size)
+    if data is None:
+        raise Exception("Connection closed within a message")
+    return json.loads(data.decode("utf-8"))
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            if chunks:
+                raise Exception("Connection closed within a message")
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def render_remote(socket_path, request):
+    # client side: returns the output of the request or raises its error
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        send_message(sock, request)
+        response = recv_message(sock)
+    if response is None:
+        raise Exception("Render server closed the connection")
+    if not response.get("ok"):
+        raise Exception(response.get("error"))
+    return response.get("output")
+
+
+class RenderServer(object):
+
+    # Keeps one code generator with shared exports per template directory
+    # and config, so parsed templates and loaded imports stay warm across
+    # requests. A background thread polls the template directories every
+    # poll_interval seconds, so changed templates are picked up within that
+    # time without scanning the directories for every request.
+
+    def __init__(self, socket_path, cache_dir=None, poll_interval=0.5):
+        self.socket_path = socket_path
+        self.ready = threading.Event()  # set when requests are accepted
+        self._cache_dir = cache_dir
+        self._poll_interval = poll_interval
+        self._code_generators = {}
+        self._watcher = FileWatcher([])
+        self._lock = threading.Lock()  # guards the code generators
+        self._watch_lock = threading.Lock()  # guards the watcher
+        self._stopped = threading.Event()
+        self._server = None
+
+    def serve_forever(self):
+        server_class = getattr(socketserver, "ThreadingUnixStreamServer", None)
+        if server_class is None:
+            raise Exception("Unix domain sockets are not supported on this platform")
+        self._remove_stale_socket()
+        self._server = server_class(self.socket_path, _RequestHandler, bind_and_activate=False)
+        try:
+            self._server.server_bind()
+            # connecting fails until the server listens
+            os.chmod(self.socket_path, 0o600)
+            self._server.server_activate()
+        except BaseException:
+            self._server.server_close()
+            raise
+        self._server.daemon_threads = True
+        self._server.render_server = self
+        self._stopped.clear()
+        watch_thread = threading.Thread(target=self._watch_templates, daemon=True)
+        watch_thread.start()
+        try:
+            self.ready.set()
+            self._server.serve_forever()
+        finally:
+            self._stopped.set()
+            watch_thread.join()
+            self._server.server_close()
+            os.remove(self.socket_path)
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+    def check_templates(self):
+        # invalidates the templates changed since the last check
+        with self._watch_lock:
+            changed_files = self._watcher.poll()
+            if not changed_files:
+                return
+            with self._lock:
+                code_generators = list(self._code_generators.values())
+            for code_generator in code_generators:
+                code_generator.invalidate(changed_files)
+
+    def handle(self, request):
+        try:
+            return {"ok": True, "output": self.render(request)}
+        except Exception as e:
+            return {"ok": False, "error": str(e) or e.__class__.__name__}
+
+    def render(self, request):
+        if not isinstance(request, dict) or "template" not in request:
+            raise Exception("Request needs a 'template'")
+        template_file = os.path.abspath(request["template"])
+        config = Config(dict_access=bool(request.get("dict_access", False)))
+        code_generator = self._get_code_generator(os.path.dirname(template_file), config)
+        if "params_file" in request:
+            params_file = request["params_file"]
+            format_name = request.get("params_format")
+            params_format = get_format(format_name) if format_name is not None else find_format(params_file)
+            if params_format.name in UNSAFE_PARAMS_FORMATS:
+                raise Exception(f"Params format '{params_format.name}' is not accepted by the render server")
+            params = load_params(params_file,
+                                 request.get("stream_params", False),
+                                 request.get("mmap", False),
+                                 request.get("items_name", "items"),
+                                 params_format.name)
+        else:
+            params = request.get("params", {})
+        output = code_generator.load(template_file).render(**params)
+        output_file = request.get("output")
+        if output_file is None:
+            return output
+        write_output(output_file, output)
+        return None
+
+    def _get_code_generator(self, search_dir, config):
+        key = (search_dir, config.key())
+        with self._lock:
+            code_generator = self._code_generators.get(key)
+        if code_generator is not None:
+            return code_generator
+        # The directory is watched before templates are loaded from it, so
+        # no change is missed
+        with self._watch_lock:
+            with self._lock:
+                code_generator = self._code_generators.get(key)
+                if code_generator is not None:
+                    return code_generator
+                search_dirs = set([path for path, _ in self._code_generators])
+            if search_dir not in search_dirs:
+                self._watcher.set_paths(sorted(search_dirs | set([search_dir])))
+            code_generator = CodeGenerator([search_dir],
+                                           cache_dir=self._cache_dir,
+                                           share_exports=True,
+                                           config=config)
+            with self._lock:
+                self._code_generators[key] = code_generator
+        return code_generator
+
+    def _watch_templates(self):
+        while not self._stopped.wait(self._poll_interval):
+            self.check_templates()
+
+    def _remove_stale_socket(self):
+        # left over by a server which did not shut down
+        try:
+            if not stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                return
+        except FileNotFoundError:
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                os.remove(self.socket_path)
+                return
+        raise Exception(f"A render server is already listening on {self.socket_path}")
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        render_server = self.server.render_server
+        while True:
+            try:
+                request = recv_message(self.request)
+            except Exception as e:
+                send_message(self.request, {"ok": False, "error": f"Invalid request: {e}"})
+                return
+            if request is None:
+                return
+            send_message(self.request, render_server.handle(request))
+
@@ -0,0 +1,138 @@
+import threading
+import weakref
+from collections import OrderedDict
+from schablonesk.ast import *
+from schablonesk.environment import UNDEFINED
+
+
+class SnippetCache(object):
+
+    # Memoizes the output of pasted snippets whose result only depends on
+    # their arguments, i.e. snippets without function calls, attribute
+    # access or nested pastes, called with immutable argument values
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        self._pure_snippets = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def make_key(self, snippet, arg_values, indent=None):
+        if not self.is_pure(snippet):
+            return None
+        arg_keys = []
+        for value in arg_values:
+            value_key = _make_value_key(value)
+            if value_key is None:
+                return None
+            arg_keys.append(value_key)
+        return snippet, tuple(arg_keys), indent
+
+    def get(self, key):
+        with self._lock:
+            value = self._values.get(key, UNDEFINED)
+            if value is UNDEFINED:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._values.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._values[key] = value
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def is_pure(self, snippet):
+        pure = self._pure_snippets.get(snippet)
+        if pure is None:
+            checker = _PurityChecker()
+            for stmt in snippet.statements:
+                stmt.accept(checker)
+            pure = checker.pure
+            with self._lock:
+                self._pure_snippets[snippet] = pure
+        return pure
+
+
+_IMMUTABLE_TYPES = (str, int, bool, type(None))
+
+
+def _make_value_key(value):
+    # the type is part of the key since e.g. 1, 1.0 and True are equal
+    # but are rendered differently
+    value_type = type(value)
+    if value_type in _IMMUTABLE_TYPES:
+        return value_type, value
+    if value_type is float:
+        return value_type, repr(value)
+    if value_type is tuple or value_type is frozenset:
+        items = [_make_value_key(item) for item in value]
+        if None in items:
+            return None
+        return value_type, value_type(items)
+    return None
+
+
+class _PurityChecker(BaseVisitor):
+
+    def __init__(self):
+        BaseVisitor.__init__(self)
+        self.pure = True
+
+    def visit_text(self, text):
+        for part in text.parts:
+            if not isinstance(part, str):
+                part.accept(self)
+
+    def visit_block(self, block):
+        for stmt in block.statements:
+            stmt.accept(self)
+
+    def visit_cond(self, cond_block):
+        for condition, stmt in cond_block.branches:
+            condition.accept(self)
+            stmt.accept(self)
+
+    def visit_for(self, for_block):
+        for_block.list_expr.accept(self)
+        if for_block.filter_cond:
+            for_block.filter_cond.accept(self)
+        for stmt in for_block.statements:
+            stmt.accept(self)
+
+    def visit_assignment(self, assignment):
+        assignment.source.accept(self)
+
+    def visit_snippet_call(self, snippet_call):
+        self.pure = False
+
+    def visit_call(self, func_call):
+        self.pure = False
+
+    def visit_expr(self, expr):
+        if isinstance(expr, QualifiedName):
+            self.pure = False
+
+    def visit_logical_bin(self, logical_bin):
+        logical_bin.left.accept(self)
+        logical_bin.right.accept(self)
+
+    def visit_logical_rel(self, logical_rel):
+        logical_rel.left.accept(self)
+        logical_rel.right.accept(self)
+
+    def visit_negation(self, negation):
+        negation.expr.accept(self)
@@ -0,0 +1,128 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from schablonesk.config import Config
+from schablonesk.environment import Environment
+from schablonesk.interpreter import Interpreter
+from schablonesk.compiler import Compiler
+from schablonesk.profiler import ProfilingInterpreter
+
+
+class CompiledTemplate(object):
+
+    def __init__(self, ast, create_template_exports, compiled=False, snippet_cache=None):
+        self.ast = ast
+        self._create_template_exports = create_template_exports
+        self._compiled = compiled
+        self._snippet_cache = snippet_cache
+        self._stream_func = None
+        self._async_stream_func = None
+
+    def render(self, **params):
+        if not self._compiled:
+            env = self._create_env(params)
+            template_exports = self._create_template_exports()
+            return Interpreter(env, template_exports, self._snippet_cache).eval(self.ast)
+        return "".join(self.stream(**params))
+
+    def profile(self, profiler, **params):
+        return self.profile_as(None, profiler, params)
+
+    def profile_as(self, template_name, profiler, params):
+        # renders by the interpreter and records per node statistics in
+        # profiler, attributed to template_name
+        env = self._create_env(params)
+        interpreter = ProfilingInterpreter(env, self._create_template_exports(), self._snippet_cache,
+                                           profiler, template_name)
+        return interpreter.eval(self.ast)
+
+    def stream(self, **params):
+        # The interpreter yields a chunk per statement and per item of loops
+        # at the top level and saves compiling one-shot renders, compiled
+        # templates yield finer chunks
+        if not self._compiled:
+            env = self._create_env(params)
+            yield from Interpreter(env, self._create_template_exports(), self._snippet_cache).stream(self.ast)
+            return
+        if self._stream_func is None:
+            self._stream_func = Compiler().compile_stream(self.ast)
+        env = self._create_env(params)
+        yield from self._stream_func(env, self._create_template_exports(), self._snippet_cache)
+
+    def stream_async(self, **params):
+        if self._async_stream_func is None:
+            self._async_stream_func = Compiler(async_mode=True).compile_stream(self.ast)
+        env = self._create_env(params)
+        return self._async_stream_func(env, self._create_template_exports(), self._snippet_cache)
+
+    async def render_async(self, **params):
+        return "".join([chunk async for chunk in self.stream_async(**params)])
+
+    def render_to(self, fileobj, **params):
+        for chunk in self.stream(**params):
+            fileobj.write(chunk)
+
+    @staticmethod
+    def _create_env(params):
+        env = Environment()
+        for name, value in params.items():
+            env.set_value(name, value)
+        return env
+
+
+class NamedTemplate(object):
+
+    # A compiled template together with the name it was loaded by. Compiled
+    # templates are shared by content, so the name is kept in this wrapper
+    # and not in the shared template.
+
+    def __init__(self, template, name):
+        self.template = template
+        self.name = name
+
+    def profile(self, profiler, **params):
+        return self.template.profile_as(self.name, profiler, params)
+
+    def __getattr__(self, attr_name):
+        return getattr(self.template, attr_name)
+
+
+class TemplateCache(object):
+
+    def __init__(self, create_template, max_size=128, config=None):
+        self._create_template = create_template
+        self._max_size = max_size
+        self._config = config
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_template(self, template_code):
+        key = self.make_key(template_code, self._config)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                return template
+
+        # parse outside of the lock, a concurrent parse of the same code
+        # just yields an equivalent template
+        template = self._create_template(template_code)
+        with self._lock:
+            self._templates[key] = template
+            while len(self._templates) > self._max_size:
+                self._templates.popitem(last=False)
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+    def __len__(self):
+        return len(self._templates)
+
+    @staticmethod
+    def make_key(template_code, config=None):
+        if config is None:
+            config = Config.get()
+        digest = hashlib.sha256(template_code.encode("utf-8")).hexdigest()
+        return config.key() + (digest,)
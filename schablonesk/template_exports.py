@@ -1,28 +1,53 @@
 import os.path
+import threading
+from collections import OrderedDict
+from schablonesk.config import Config
 from schablonesk.parser import Parser
 from schablonesk.scanner import Scanner
 
 
 class TemplateExports(object):
 
-    def __init__(self, search_paths):
+    # Shared exports may be read and invalidated by several threads, the
+    # lock guards the loaded templates but not the loading itself
+
+    def __init__(self, search_paths, template_cache=None, disk_cache=None, config=None, index=None):
         self._exports = {}
+        self._template_paths = {}
+        self._lock = threading.Lock()
+        self._config = config
         self._search_paths = search_paths
+        self._template_cache = template_cache
+        self._disk_cache = disk_cache
+        self._index = index
 
     def set_template_code(self, template_name, code):
-        template_ast = Parser(Scanner().scan(code)).parse()
+        template_ast = self._parse(code)
+        _set_template_name(template_ast, template_name)
+        self._set_template_ast(template_name, template_ast)
+
+    def _parse(self, code):
+        if self._template_cache is not None:
+            return self._template_cache.get_template(code).ast
+        else:
+            return Parser(Scanner(self._config).scan(code), self._config).parse()
+
+    def _set_template_ast(self, template_name, template_ast):
         if template_ast is None:
             raise Exception(f"Cannot parse template {template_name}")
         all_exports = dict(
             [(snippet.name.lexeme, snippet) for snippet in template_ast.snippets]
         )
-        self._exports[template_name] = all_exports
+        with self._lock:
+            self._exports[template_name] = all_exports
+        return all_exports
 
     def get_exports(self, template_name, used_names=[]):
-        if template_name not in self._exports:
-            self._load(template_name)
+        with self._lock:
+            all_exports = self._exports.get(template_name)
+        if all_exports is None:
+            all_exports = self._load(template_name)
 
-        all_exports = self._exports[template_name]
         if not used_names:
             return all_exports
         else:
@@ -30,13 +55,138 @@ class TemplateExports(object):
                          for name in used_names
                          if name in all_exports])
 
+    def invalidate(self, changed_files):
+        # drops loaded templates whose file changed or would now be shadowed
+        # by a new file in an earlier search path
+        changed_files = set([os.path.abspath(path) for path in changed_files])
+        if self._index is not None and changed_files:
+            self._index.refresh()
+        with self._lock:
+            for template_name in list(self._exports):
+                candidates = [os.path.join(search_path, template_name) for search_path in self._search_paths]
+                if template_name in self._template_paths:
+                    candidates.append(self._template_paths[template_name])
+                if any(os.path.abspath(path) in changed_files for path in candidates):
+                    del self._exports[template_name]
+                    self._template_paths.pop(template_name, None)
+
+    def get_template_path(self, template_name):
+        with self._lock:
+            template_path = self._template_paths.get(template_name)
+        if template_path is None:
+            if self._index is not None:
+                template_path = self._index.find(template_name)
+            else:
+                template_path = find_template_file(self._search_paths, template_name)
+            if template_path is None:
+                raise Exception(f"Cannot load template file '{template_name}'")
+            with self._lock:
+                self._template_paths[template_name] = template_path
+        return template_path
+
     def _load(self, template_name):
+        template_path = self.get_template_path(template_name)
+        # parsed library templates are shared by all instances in the process
+        stat = os.stat(template_path)
+        config = self._config if self._config is not None else Config.get()
+        key = (os.path.abspath(template_path), stat.st_mtime_ns, stat.st_size, config.key())
+        template_ast = _shared_templates.get(key)
+        if template_ast is None:
+            template_ast = self._read_template(template_path)
+            _set_template_name(template_ast, template_name)
+            _shared_templates.put(key, template_ast)
+        return self._set_template_ast(template_name, template_ast)
+
+    def _read_template(self, template_path):
+        if self._disk_cache is not None:
+            template_ast = self._disk_cache.load(template_path)
+            if template_ast is not None:
+                return template_ast
+        with open(template_path, "r") as f:
+            template_ast = self._parse(f.read())
+        if self._disk_cache is not None:
+            self._disk_cache.store(template_path, template_ast)
+        return template_ast
+
+
+class TemplateIndex(object):
+
+    # Maps template names to the file found first in the search paths, so
+    # loading a template does not probe every search path. A directory is
+    # listed by os.scandir when a template in it is requested first, call
+    # refresh() after templates have been added or removed.
+
+    def __init__(self, search_paths):
+        self._search_paths = list(search_paths)
+        self._dirs = {}  # directory relative to the search paths -> {file name: path}
+
+    def find(self, template_name):
+        name = os.path.normpath(template_name)
+        if os.path.isabs(name) or name.startswith(os.pardir):
+            # outside of the search paths
+            return find_template_file(self._search_paths, template_name)
+        dir_name, file_name = os.path.split(name)
+        dirs = self._dirs
+        files = dirs.get(dir_name)
+        if files is None:
+            # a refresh while listing only drops this listing
+            files = dirs[dir_name] = self._list(dir_name)
+        return files.get(file_name)
+
+    def refresh(self):
+        self._dirs = {}
+
+    def _list(self, dir_name):
+        ret = {}
         for search_path in self._search_paths:
-            template_path = os.path.join(search_path, template_name)
-            if os.path.exists(template_path):
-                with open(template_path, "r") as f:
-                    template_code = f.read()
-                    self.set_template_code(template_name, template_code)
-                    return
-        raise Exception(f"Cannot load template file '{template_name}'")
+            try:
+                entries = list(os.scandir(os.path.join(search_path, dir_name)))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if not entry.is_dir():
+                        ret.setdefault(entry.name, entry.path)
+                except OSError:
+                    continue
+        return ret
+
+
+class _SharedTemplates(object):
+
+    def __init__(self, max_size=256):
+        self._max_size = max_size
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            template_ast = self._templates.get(key)
+            if template_ast is not None:
+                self._templates.move_to_end(key)
+            return template_ast
+
+    def put(self, key, template_ast):
+        with self._lock:
+            self._templates[key] = template_ast
+            while len(self._templates) > self._max_size:
+                self._templates.popitem(last=False)
+
+
+_shared_templates = _SharedTemplates()
+
+
+def _set_template_name(template_ast, template_name):
+    # once when a template is loaded, loaded templates are shared between
+    # code generators and threads
+    for snippet in template_ast.snippets:
+        if snippet.template_name is None:
+            snippet.template_name = template_name
+
 
+def find_template_file(search_paths, template_name):
+    for search_path in search_paths:
+        template_path = os.path.join(search_path, template_name)
+        if os.path.exists(template_path):
+            return template_path
+    return None
@@ -1,5 +1,7 @@
 class Token(object):
 
+    __slots__ = ("category", "lexeme", "line_num")
+
     def __init__(self, category, lexeme, line_num):
         self.category = category
         self.lexeme = lexeme
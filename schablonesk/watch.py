@@ -0,0 +1,78 @@
+import os
+import time
+
+
+class FileWatcher(object):
+
+    # Polls modification time and size of the watched files. Directories
+    # are watched recursively, so new and removed files are noticed as well.
+    # Polling only needs the standard library and works on every platform
+    # and file system, including network storage.
+
+    def __init__(self, paths, interval=0.5):
+        self._paths = [os.path.abspath(path) for path in paths]
+        self._interval = interval
+        self._snapshot = self._scan()
+
+    def set_paths(self, paths):
+        # Only added paths are scanned, the snapshot of paths which are still
+        # watched is kept, so their changes are reported by the next poll
+        paths = [os.path.abspath(path) for path in paths]
+        added_paths = [path for path in paths if path not in self._paths]
+        snapshot = dict([(path, value) for path, value in self._snapshot.items()
+                         if any(_is_within(path, watched_path) for watched_path in paths)])
+        for path, value in self._scan(added_paths).items():
+            snapshot.setdefault(path, value)
+        self._paths = paths
+        self._snapshot = snapshot
+
+    def poll(self):
+        snapshot = self._scan()
+        changed = set([path for path in snapshot.keys() | self._snapshot.keys()
+                       if snapshot.get(path) != self._snapshot.get(path)])
+        self._snapshot = snapshot
+        return changed
+
+    def wait(self):
+        # blocks until at least one file changed
+        while True:
+            time.sleep(self._interval)
+            changed = self.poll()
+            if changed:
+                return changed
+
+    def _scan(self, paths=None):
+        snapshot = {}
+        for path in (paths if paths is not None else self._paths):
+            if os.path.isdir(path):
+                self._scan_dir(path, snapshot)
+            else:
+                self._add_file(path, snapshot)
+        return snapshot
+
+    def _scan_dir(self, dir_path, snapshot):
+        try:
+            entries = list(os.scandir(dir_path))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    self._scan_dir(entry.path, snapshot)
+                else:
+                    stat = entry.stat()
+                    snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass  # removed while scanning
+
+    @staticmethod
+    def _add_file(path, snapshot):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+
+
+def _is_within(path, watched_path):
+    return path == watched_path or path.startswith(os.path.join(watched_path, ""))
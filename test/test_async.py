@@ -0,0 +1,75 @@
+import asyncio
+import os
+import unittest
+from schablonesk import CodeGenerator
+
+
+class _Person(object):
+
+    def __init__(self, name, age):
+        self.name = name
+        self.age = age
+
+    async def get_age(self):
+        return self.age
+
+
+class _AsyncPeople(object):
+
+    def __init__(self, people):
+        self._people = people
+
+    async def __aiter__(self):
+        for person in self._people:
+            await asyncio.sleep(0)
+            yield person
+
+
+async def _fetch(value):
+    await asyncio.sleep(0)
+    return value
+
+
+class AsyncTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.code_generator = CodeGenerator([os.path.dirname(__file__)])
+
+    async def test_awaitable_values(self):
+        code = ":> age <- person.get_age()\nHello $(name), $(name)!\n$(person.name) is $(age)"
+
+        output = await self.code_generator.generate_code_async(
+            code, name=_fetch("World"), person=_fetch(_Person("Herbert", 55)))
+
+        self.assertEqual("Hello World, World!\nHerbert is 55", output)
+
+    async def test_awaitable_items(self):
+        code = ":> for person in people\n$(person.name) $(person.name) $(person.age)\n:> endfor"
+        people = [("Herbert", 55), ("Erika", 42)]
+
+        expected = self.code_generator.generate_code(code, people=[_Person(*person) for person in people])
+        output = await self.code_generator.generate_code_async(
+            code, people=[_Person(_fetch(name), age) for name, age in people])
+
+        self.assertEqual(expected, output)
+
+    async def test_async_iterable(self):
+        code = ":> for person in people where person.age > 18\n$(person.name)\n:> endfor"
+        people = [_Person("Herbert", 55), _Person("Willi", 5), _Person("Erika", 42)]
+
+        expected = self.code_generator.generate_code(code, people=people)
+        output = await self.code_generator.generate_code_async(code, people=_AsyncPeople(people))
+
+        self.assertEqual(expected, output)
+
+    async def test_use_statement(self):
+        with open(os.path.join(os.path.dirname(__file__), "index.html.schablonesk")) as f:
+            code = f.read()
+        hobbies = ["Hacking", "Running", "Reading"]
+
+        expected = self.code_generator.generate_code(code, title="Hobbies", hobbies=hobbies)
+        chunks = [chunk async for chunk in self.code_generator.generate_iter_async(
+            code, title=_fetch("Hobbies"), hobbies=_AsyncPeople(hobbies))]
+
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(expected, "".join(chunks))
@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from schablonesk import CodeGenerator
+from schablonesk.batch import BatchJob, BatchRunner, read_manifest, run_batch
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.test_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run_batch(self):
+        hobbies = [["Hacking"], ["Running", "Reading"]]
+        manifest_file = os.path.join(self.tmp_dir, "manifest.jsonl")
+        with open(manifest_file, "w") as f:
+            for i, items in enumerate(hobbies):
+                job = {
+                    "template": os.path.join(self.test_dir, "index.html.schablonesk"),
+                    "params": {"title": f"Hobbies {i}", "hobbies": items},
+                    "output": f"out/index{i}.html"
+                }
+                f.write(json.dumps(job) + "\n")
+
+        run_batch(read_manifest(manifest_file))
+
+        code_generator = CodeGenerator([self.test_dir])
+        for i, items in enumerate(hobbies):
+            expected = code_generator.load("index.html.schablonesk").render(
+                title=f"Hobbies {i}", hobbies=items) + "\n"
+            with open(os.path.join(self.tmp_dir, "out", f"index{i}.html"), "r") as f:
+                self.assertEqual(expected, f.read())
+
+    def test_params_file(self):
+        with open(os.path.join(self.tmp_dir, "params.json"), "w") as f:
+            json.dump({"name": "World"}, f)
+        with open(os.path.join(self.tmp_dir, "hello.schablonesk"), "w") as f:
+            f.write("Hello $(name)!")
+        manifest_file = os.path.join(self.tmp_dir, "manifest.json")
+        with open(manifest_file, "w") as f:
+            json.dump([{"template": "hello.schablonesk", "params": "params.json", "output": "hello.txt"}], f)
+
+        run_batch(read_manifest(manifest_file))
+
+        with open(os.path.join(self.tmp_dir, "hello.txt"), "r") as f:
+            self.assertEqual("Hello World!\n", f.read())
+
+    def test_render_many(self):
+        code_generator = CodeGenerator([self.test_dir])
+        jobs = [("index.html.schablonesk", {"title": f"Hobbies {i}", "hobbies": ["Hacking"] * i})
+                for i in range(8)]
+
+        expected = code_generator.render_many(jobs)
+        self.assertEqual(expected, code_generator.render_many(jobs, workers=2))
+        self.assertEqual(code_generator.load("index.html.schablonesk").render(**jobs[3][1]), expected[3])
+
+    def test_incremental(self):
+        with open(os.path.join(self.tmp_dir, "lib.schablonesk"), "w") as f:
+            f.write(":> snippet greet(name)\nHello $(name)!\n:> endsnippet")
+        with open(os.path.join(self.tmp_dir, "hello.schablonesk"), "w") as f:
+            f.write(":> use greet from 'lib.schablonesk'\n:> paste greet(name)")
+        state_file = os.path.join(self.tmp_dir, "state.json")
+
+        def run(names):
+            jobs = [BatchJob(os.path.join(self.tmp_dir, "hello.schablonesk"),
+                             {"name": name, "unused": idx},
+                             os.path.join(self.tmp_dir, f"hello{idx}.txt"))
+                    for idx, name in enumerate(names)]
+            return [job.output_file for job in run_batch(jobs, state_file=state_file)]
+
+        self.assertEqual(2, len(run(["World", "Erika"])))
+        self.assertEqual([], run(["World", "Erika"]))
+        self.assertEqual([os.path.join(self.tmp_dir, "hello1.txt")], run(["World", "Willi"]))
+
+        with open(os.path.join(self.tmp_dir, "lib.schablonesk"), "w") as f:
+            f.write(":> snippet greet(name)\nHi $(name)!\n:> endsnippet")
+        self.assertEqual(2, len(run(["World", "Willi"])))
+        with open(os.path.join(self.tmp_dir, "hello1.txt"), "r") as f:
+            self.assertEqual("Hi Willi!\n", f.read())
+
+        os.remove(os.path.join(self.tmp_dir, "hello0.txt"))
+        self.assertEqual([os.path.join(self.tmp_dir, "hello0.txt")], run(["World", "Willi"]))
+
+    def test_incremental_failed_render(self):
+        template_file = os.path.join(self.tmp_dir, "hello.schablonesk")
+        runner = BatchRunner(incremental=True)
+
+        def run(names):
+            jobs = [BatchJob(template_file, {"name": name}, os.path.join(self.tmp_dir, f"{idx}.txt"))
+                    for idx, name in enumerate(names)]
+            return runner.run(jobs)
+
+        with open(template_file, "w") as f:
+            f.write("v1 $(name)")
+        run(["a", "b"])
+        with open(template_file, "w") as f:
+            f.write("v2 $(name.upper)")
+        with self.assertRaises(Exception):
+            run([1, "b"])
+
+        # the failed run did not mark any job as up to date
+        self.assertEqual(2, len(run(["a", "b"])))
+        with open(os.path.join(self.tmp_dir, "1.txt"), "r") as f:
+            self.assertTrue(f.read().startswith("v2 "))
+
+    def test_parallel_jobs(self):
+        jobs = []
+        for dir_name in ("a", "b"):
+            os.mkdir(os.path.join(self.tmp_dir, dir_name))
+            with open(os.path.join(self.tmp_dir, dir_name, "hello.schablonesk"), "w") as f:
+                f.write(f"{dir_name} $(name)")
+            jobs += [BatchJob(os.path.join(self.tmp_dir, dir_name, "hello.schablonesk"), {"name": name},
+                              os.path.join(self.tmp_dir, "out", f"{dir_name}{name}.txt"))
+                     for name in ("x", "y")]
+
+        # one pool for the jobs of all template directories
+        self.assertEqual(jobs, run_batch(jobs, workers=2))
+        for job in jobs:
+            with open(job.output_file, "r") as f:
+                self.assertEqual(os.path.basename(job.output_file)[0] + " " + job.params["name"] + "\n", f.read())
@@ -0,0 +1,30 @@
+import json
+import os
+import tempfile
+import unittest
+from schablonesk import bench
+
+
+class BenchTest(unittest.TestCase):
+
+    def test_quick_run(self):
+        fd, output_file = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            bench.main(["--quick", "--repeat", "1", "--max-items", "1000", "--params-scale", "10",
+                        "--output", output_file])
+            with open(output_file, "r") as f:
+                report = json.load(f)
+        finally:
+            os.remove(output_file)
+
+        names = {result["name"] for result in report["benchmarks"]}
+        self.assertEqual({"scan_parse", "for_loop", "paste_nesting", "dense_text", "use_imports"}, names)
+        for result in report["benchmarks"]:
+            self.assertIn("parse", result["phases"])
+            self.assertTrue(result["peak_memory_bytes"]["interpret"] > 0)
+        # explicit sizes win over the --quick defaults
+        self.assertEqual([1000], [result["size"] for result in report["benchmarks"] if result["name"] == "for_loop"])
+        self.assertEqual({10}, {result["size"] for result in report["params_formats"]})
+        formats = {result["format"] for result in report["params_formats"]}
+        self.assertTrue({"json", "jsonl", "pickle", "binary"} <= formats)
@@ -1,6 +1,10 @@
+import asyncio
+import io
 import os
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from schablonesk import CodeGenerator
+from schablonesk.config import Config
 
 
 class Person(object):
@@ -38,6 +42,90 @@ class CodegenTest(unittest.TestCase):
 
         print(generated)
 
+    def test_compile_is_cached(self):
+        code_generator = CodeGenerator()
+        template_code = "Hello $(name)!"
+
+        template = code_generator.compile(template_code)
+
+        self.assertIs(template, code_generator.compile(template_code))
+        self.assertIsNot(template, code_generator.compile(template_code + " Bye."))
+        self.assertEqual("Hello World!", template.render(name="World"))
+
+    def test_cache_eviction(self):
+        code_generator = CodeGenerator(cache_size=2)
+
+        template = code_generator.compile("$(a)")
+        code_generator.compile("$(b)")
+        code_generator.compile("$(c)")
+
+        self.assertIsNot(template, code_generator.compile("$(a)"))
+
+    def test_load(self):
+        search_path = os.path.dirname(__file__)
+        hobbies = ["Hacking", "Running", "Reading"]
+        expected = CodeGenerator([search_path]).generate_code(
+            self._read_file(search_path + "/index.html.schablonesk"),
+            title="Hobbies",
+            hobbies=hobbies
+        )
+
+        for compiled in (False, True):
+            template = CodeGenerator([search_path], compiled=compiled).load("index.html.schablonesk")
+            self.assertEqual(expected, template.render(title="Hobbies", hobbies=hobbies))
+
+    def test_stream(self):
+        file_path = os.path.dirname(__file__) + "/list.schablonesk"
+        template_code = self._read_file(file_path)
+        people = [Person("Mustermann", "Herbert", 55), Person("Mustermann", "Erika", 42)]
+        expected = CodeGenerator().generate_code(template_code, people=people)
+
+        for compiled in (False, True):
+            code_generator = CodeGenerator(compiled=compiled)
+
+            chunks = list(code_generator.generate_iter(template_code, people=people))
+            output = io.StringIO()
+            code_generator.compile(template_code).render_to(output, people=people)
+
+            self.assertTrue(len(chunks) > 1)
+            self.assertEqual(expected, "".join(chunks))
+            self.assertEqual(expected, output.getvalue())
+
+    def test_config_per_generator(self):
+        default_generator = CodeGenerator()
+        custom_generator = CodeGenerator(config=Config("%%", "{{", "}}"))
+        default_code = ":> for i in items\n$(i) {{i}}\n:> endfor"
+        custom_code = "%% for i in items\n$(i) {{i}}\n%% endfor"
+
+        def render(i):
+            if i % 2:
+                return default_generator.generate_code(default_code, items=[i])
+            return custom_generator.generate_code(custom_code, items=[i])
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            outputs = list(executor.map(render, range(20)))
+
+        for i, output in enumerate(outputs):
+            self.assertEqual(f"{i} {{{{i}}}}" if i % 2 else f"$(i) {i}", output)
+
+    def test_dict_access(self):
+        code = ":> for p in people where p.address.city <> 'Bonn'\n$(p.name): $(p.address.city) $(p.items)\n:> endfor"
+        people = [
+            {"name": "Ada", "address": {"city": "London"}, "items": 2},
+            {"name": "Beethoven", "address": {"city": "Bonn"}, "items": 1},
+            {"name": "Kant", "address": Person("Königsberg", None, None), "items": 3}
+        ]
+        people[2]["address"].city = "Königsberg"
+        expected = os.linesep.join(["Ada: London 2", "Kant: Königsberg 3"])
+
+        for compiled in (False, True):
+            code_generator = CodeGenerator(compiled=compiled, config=Config(dict_access=True))
+            self.assertEqual(expected, code_generator.generate_code(code, people=people))
+            with self.assertRaises(AttributeError):
+                CodeGenerator(compiled=compiled).generate_code(code, people=people)
+        code_generator = CodeGenerator(config=Config(dict_access=True))
+        self.assertEqual(expected, asyncio.run(code_generator.generate_code_async(code, people=people)))
+
     @staticmethod
     def _read_file(file_path):
         f = open(file_path, "r")
@@ -0,0 +1,118 @@
+import os
+import unittest
+
+from schablonesk.scanner import Scanner
+from schablonesk.parser import Parser
+from schablonesk.environment import Environment
+from schablonesk.interpreter import Interpreter
+from schablonesk.compiler import Compiler
+from schablonesk.template_exports import TemplateExports
+
+
+class _Person(object):
+
+    def __init__(self, name, age):
+        self.name = name
+        self.age = age
+
+
+class CompilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scanner = Scanner()
+
+    def assert_same_output(self, code, **params):
+        ast = Parser(self.scanner.scan(code)).parse()
+        templ_exports = TemplateExports([os.path.dirname(__file__)])
+
+        expected = Interpreter(self._create_env(params), templ_exports).eval(ast)
+        actual = Compiler().compile(ast)(self._create_env(params), templ_exports)
+
+        self.assertEqual(expected, actual)
+        return actual
+
+    @staticmethod
+    def _create_env(params):
+        env = Environment()
+        for name, value in params.items():
+            env.set_value(name, value)
+        return env
+
+    def test_text(self):
+        code = "Guten Tag, $( first_name) $(last_name)! $(42) $('O\\'Hara') $(unclosed"
+        actual = self.assert_same_output(code, first_name="Herbert", last_name="Mustermann")
+        self.assertEqual("Guten Tag, Herbert Mustermann! 42 O'Hara unclosed", actual)
+
+    def test_cond_block(self):
+        code = """:> cond
+            :> input == 42 and not (input < 0)
+                :> cond someone_asked
+        The answer to everything: $(input).
+                :> endcond
+            :> else
+        Some random number ($(input)).
+        :> endcond"""
+        self.assert_same_output(code, input=42, someone_asked=True)
+        self.assert_same_output(code, input=23, someone_asked=True)
+
+    def test_for_block(self):
+        code = """<ul>
+:> for person in people where person.age >= 18 or is_last
+    :> cond is_first
+    <li class="first">$(person.name)</li>
+    :> else
+    <li>$(person.name)</li>
+    :> endcond
+:> endfor
+</ul>"""
+        people = [_Person("Herbert", 55), _Person("Willi", 5), _Person("Erika", 42), _Person("Max", 3)]
+        self.assert_same_output(code, people=people)
+
+    def test_assignment_in_block(self):
+        code = """
+            :> for state in states
+            :> cond
+                :> not state
+                    :> block
+                        :> status_text <- 'open'
+                        :> 'set to done' -> label
+                    :> endblock
+                :> else
+                    :> block
+                        :> status_text <- 'done'
+                        :> label <- 'reopen'
+                    :> endblock
+            :> endcond
+$(status_text), $(label)
+:> endfor"""
+        self.assert_same_output(code, states=[False, True])
+
+    def test_snippet_call(self):
+        code = """:> snippet number_info (n)
+The number is: $(n).
+        :> endsnippet
+        :> for number in numbers where number <> 2
+            :> paste number_info(number) indent by 4 spaces
+            :> paste number_info(add(number 1)) indent by 1 tabs
+        :> endfor"""
+        self.assert_same_output(code, numbers=[1, 2, 3], add=lambda a, b: a + b)
+
+    def test_use_statement(self):
+        file_path = os.path.join(os.path.dirname(__file__), "index.html.schablonesk")
+        with open(file_path, "r") as f:
+            code = f.read()
+        self.assert_same_output(code, title="Hobbies", hobbies=["Hacking", "Running"])
+
+    def test_variable_scopes(self):
+        code = """:> for number in numbers
+$(number): $(label) $(nothing)
+:> label <- 'inner'
+:> endfor
+$(label)"""
+        self.assert_same_output(code, numbers=[1, 2], label="outer", nothing=None)
+
+    def test_undefined_identifier(self):
+        ast = Parser(self.scanner.scan("$(unknown)")).parse()
+        render = Compiler().compile(ast)
+        with self.assertRaises(Exception):
+            render(Environment(), TemplateExports([os.curdir]))
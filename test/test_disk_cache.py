@@ -0,0 +1,61 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from schablonesk import CodeGenerator, Config, DiskCache, TemplateExports
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+        self.template_path = os.path.join(self.tmp_dir, "lib.schablonesk")
+        self._write_template(":> snippet greet (name)\nHello $(name)!\n:> endsnippet")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_store_and_load(self):
+        disk_cache = DiskCache(self.cache_dir)
+
+        self.assertIsNone(disk_cache.load(self.template_path))
+        TemplateExports([self.tmp_dir], disk_cache=disk_cache).get_exports("lib.schablonesk", ["greet"])
+
+        self.assertIsNotNone(disk_cache.load(self.template_path))
+
+    def test_invalidate_on_change(self):
+        disk_cache = DiskCache(self.cache_dir)
+        TemplateExports([self.tmp_dir], disk_cache=disk_cache).get_exports("lib.schablonesk", ["greet"])
+
+        self._write_template(":> snippet greet (name)\nHi $(name)!\n:> endsnippet")
+
+        self.assertIsNone(disk_cache.load(self.template_path))
+
+    def test_render_with_cache_dir(self):
+        template_code = ":> use greet from 'lib.schablonesk'\n:> paste greet('World')"
+
+        for _ in range(2):
+            code_generator = CodeGenerator([self.tmp_dir], cache_dir=self.cache_dir)
+            self.assertEqual("Hello World!", code_generator.generate_code(template_code))
+
+    def test_configs_keep_own_entries(self):
+        disk_caches = [DiskCache(self.cache_dir), DiskCache(self.cache_dir, Config(dict_access=True))]
+        for idx, disk_cache in enumerate(disk_caches):
+            disk_cache.store(self.template_path, idx)
+
+        for idx, disk_cache in enumerate(disk_caches):
+            self.assertEqual(idx, disk_cache.load(self.template_path))
+
+    def test_corrupt_entry(self):
+        disk_cache = DiskCache(self.cache_dir)
+        # unpickles, but not to a (key, ast) pair
+        with open(disk_cache._get_cache_file(self.template_path), "wb") as f:
+            pickle.dump(None, f)
+
+        self.assertIsNone(disk_cache.load(self.template_path))
+
+    def _write_template(self, code):
+        with open(self.template_path, "w") as f:
+            f.write(code)
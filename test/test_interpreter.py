@@ -289,6 +289,65 @@ class InterpreterTest(unittest.TestCase):
 
         self.assertEqual(expected, actual)
 
+    def test_for_block_lazy_iterable(self):
+
+        def numbers():
+            yield from [1, 2, 3]
+
+        global_env = Environment()
+        global_env.set_value("numbers", numbers())
+        interpreter = Interpreter(global_env)
+
+        code = """:> for number in numbers
+            :> cond is_first or is_last
+        The number is $(number).
+            :> endcond
+        :> endfor"""
+
+        ast = self.create_parser(code).parse()
+        value = interpreter.eval(ast)
+
+        expected = [
+            "The number is 1.",
+            "The number is 3."
+        ]
+        actual = [line.strip() for line in value.split(os.linesep)]
+
+        self.assertEqual(expected, actual)
+
+    def test_none_value(self):
+
+        global_env = Environment()
+        global_env.set_value("nothing", None)
+        interpreter = Interpreter(global_env)
+
+        ast = self.create_parser("Value: $(nothing)").parse()
+        self.assertEqual("Value: None", interpreter.eval(ast))
+
+        ast = self.create_parser("Value: $(unknown)").parse()
+        self.assertRaises(Exception, interpreter.eval, ast)
+
+    def test_assignment_in_loop_scope(self):
+
+        global_env = Environment()
+        global_env.set_value("numbers", [1, 2])
+        global_env.set_value("label", "outer")
+        interpreter = Interpreter(global_env)
+
+        code = """:> for number in numbers
+$(number): $(label)
+:> label <- 'inner'
+:> endfor
+$(label)"""
+
+        ast = self.create_parser(code).parse()
+        value = interpreter.eval(ast)
+
+        expected = ["1: outer", "2: inner", "outer"]
+        actual = list(filter(lambda line: bool(line), value.split(os.linesep)))
+
+        self.assertEqual(expected, actual)
+
     def test_left_assign(self):
 
         global_env = Environment()
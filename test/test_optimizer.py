@@ -0,0 +1,87 @@
+import os
+import unittest
+from schablonesk import CodeGenerator
+from schablonesk.ast import *
+from schablonesk.scanner import Scanner
+from schablonesk.parser import Parser
+from schablonesk.optimizer import Optimizer
+
+
+class OptimizerTest(unittest.TestCase):
+
+    def test_remove_branches(self):
+        code = """:> cond
+:> 1 == 2 or false
+never
+:> not true
+never
+:> v > 1
+maybe
+:> 'a' <> 'b'
+always
+:> else
+never
+:> endcond"""
+        ast = self._optimize(code)
+
+        branches = ast.statements[0].branches
+        self.assertEqual(2, len(branches))
+        self.assertIsInstance(branches[0][0], LogicalRelation)
+        self.assertIsInstance(branches[1][0], Bool)
+        self.assertEqual(["maybe", "always"], [stmt.content for _, stmt in branches])
+
+    def test_replace_cond_by_taken_branch(self):
+        ast = self._optimize(":> cond\n:> true and 'x'\nyes\n:> else\nno\n:> endcond")
+
+        self.assertIsInstance(ast.statements[0], Text)
+        self.assertEqual("yes", ast.statements[0].content)
+
+    def test_fold_text(self):
+        ast = self._optimize("a $(true) $(1)\n:> cond\n:> true\nb $(v)\n:> endcond\nc")
+
+        self.assertEqual(("a True 1",), ast.statements[0].parts)
+        self.assertEqual(3, len(ast.statements))
+
+    def test_merge_static_texts(self):
+        code = ":> cond\n:> true\na\n:> endcond\nb\n:> block\n:> cond\n:> true\nc\n:> endcond\nd\n:> endblock"
+        ast = self._optimize(code)
+
+        self.assertEqual(2, len(ast.statements))
+        self.assertEqual(f"a{os.linesep}b", ast.statements[0].content)
+        self.assertEqual(f"c{os.linesep}d", ast.statements[1].statements[0].content)
+
+    def test_same_output(self):
+        code = """:> snippet s(v)
+:> cond
+:> false
+never
+:> endcond
+$(v)
+:> endsnippet
+:> for i in items where 1 < 2
+:> cond
+:> 1 > 2
+never
+:> endcond
+:> cond
+:> true
+$(i)
+:> endcond
+:> paste s(i)
+:> endfor"""
+        for compiled in (False, True):
+            plain = CodeGenerator(compiled=compiled, optimize=False)
+            optimized = CodeGenerator(compiled=compiled)
+            self.assertEqual(plain.generate_code(code, items=[1, 2]),
+                             optimized.generate_code(code, items=[1, 2]))
+            # a cond without value is still an error at template level
+            with self.assertRaises(Exception):
+                optimized.generate_code(":> cond\n:> false\nx\n:> endcond")
+
+    @staticmethod
+    def _optimize(code):
+        return Optimizer().optimize(Parser(Scanner().scan(code)).parse())
+
+
+if __name__ == "__main__":
+    unittest.main()
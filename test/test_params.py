@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from schablonesk import CodeGenerator, Config
+from schablonesk import params
+from schablonesk.params import LazyJsonArray, ParamsFormat, dump_params, load_params, register_format
+
+
+class ParamsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.chunk_size = params._CHUNK_SIZE
+        params._CHUNK_SIZE = 5  # values span several buffers
+
+    def tearDown(self):
+        params._CHUNK_SIZE = self.chunk_size
+        shutil.rmtree(self.work_dir)
+
+    def test_stream_arrays(self):
+        data = {"title": "Zahlen", "numbers": [1, -2.5e3, 12345678901, {"ä": ["€", None]}], "empty": [], "n": 1}
+        params_file = self._write("params.json", json.dumps(data, indent=1, ensure_ascii=False))
+
+        for use_mmap in (False, True):
+            streamed = load_params(params_file, streaming=True, use_mmap=use_mmap)
+
+            self.assertIsInstance(streamed["numbers"], LazyJsonArray)
+            self.assertEqual(data, dict((name, list(value) if isinstance(value, LazyJsonArray) else value)
+                                        for name, value in streamed.items()))
+
+    def test_bundled_params(self):
+        params_file = os.path.join(os.path.dirname(__file__), "params.json")
+
+        streamed = load_params(params_file, streaming=True)
+
+        self.assertEqual(load_params(params_file)["hobbies"], list(streamed["hobbies"]))
+
+    def test_render_lazy_items(self):
+        params_file = self._write("people.jsonl", '{"name": "Ada"}\n\n{"name": "Kant"}\n')
+        code = ":> for p in items\n:> for q in items where q <> p\n$(p.name) $(q.name) $(is_last)\n:> endfor\n:> endfor"
+
+        code_generator = CodeGenerator(compiled=True, config=Config(dict_access=True))
+
+        output = code_generator.generate_code(code, **load_params(params_file, streaming=True))
+
+        self.assertEqual(os.linesep.join(["Ada Kant True", "Kant Ada False"]), output)
+
+    def test_top_level_array(self):
+        params_file = self._write("rows.json", "[1, 2, 3]")
+
+        self.assertEqual([1, 2, 3], load_params(params_file, items_name="rows")["rows"])
+        self.assertEqual([1, 2, 3], list(load_params(params_file, streaming=True, items_name="rows")["rows"]))
+
+    def test_invalid_params(self):
+        params_file = self._write("invalid.json", '{"a": [1, 2] "b": 1}')
+
+        with self.assertRaises(Exception):
+            load_params(params_file, streaming=True)
+
+    def test_formats(self):
+        data = {"title": "Hobbies", "items": [{"name": "Hacking", "id": 1}, {"name": "Reading", "id": 2.5}]}
+
+        for file_name in ("params.json", "params.pickle", "params.schb"):
+            params_file = os.path.join(self.work_dir, file_name)
+            dump_params(data, params_file)
+            self.assertEqual(data, load_params(params_file))
+        self.assertEqual(data, load_params(params_file, use_mmap=True))
+
+        params_file = os.path.join(self.work_dir, "items.txt")
+        dump_params(data, params_file, "jsonl")
+        self.assertEqual({"items": data["items"]}, load_params(params_file, params_format="jsonl"))
+        with self.assertRaises(Exception):
+            load_params(params_file, params_format="binary")
+
+        params_file = os.path.join(self.work_dir, "params.jsonl")
+        with self.assertRaisesRegex(Exception, "'rows'"):
+            dump_params(data, params_file, items_name="rows")
+        self.assertFalse(os.path.exists(params_file))
+
+    def test_register_format(self):
+        def load(params_file, streaming, use_mmap, items_name):
+            with open(params_file, "r") as f:
+                return dict(line.strip().split("=", 1) for line in f)
+
+        register_format(ParamsFormat("properties", load, extensions=(".properties",)))
+        try:
+            params_file = self._write("params.properties", "title=Hobbies\nname=Hacking\n")
+
+            self.assertEqual({"title": "Hobbies", "name": "Hacking"}, load_params(params_file))
+            with self.assertRaises(Exception):
+                dump_params({}, params_file)
+        finally:
+            del params._formats["properties"]
+
+    def _write(self, file_name, content):
+        path = os.path.join(self.work_dir, file_name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,11 @@
+import operator
 import os
 import unittest
 
 from schablonesk.ast_printer import AstPrinter
 from schablonesk.scanner import Scanner
 from schablonesk.parser import Parser
+from schablonesk.ast import Identifier, QualifiedName
 
 
 class ParserTest(unittest.TestCase):
@@ -87,6 +89,17 @@ class ParserTest(unittest.TestCase):
 
         AstPrinter().print(ast)
 
+    def test_parse_literal_values(self):
+        code = ":> cond x < 'it\\'s' and 1.5 >= 2\nOK\n:> endcond"
+
+        ast = Parser(self.scanner.scan(code)).parse()
+        condition = ast.statements[0].branches[0][0]
+
+        self.assertEqual("it's", condition.left.right.value)
+        self.assertIs(operator.lt, condition.left.op_func)
+        self.assertEqual(1.5, condition.right.left.value)
+        self.assertIs(operator.ge, condition.right.op_func)
+
     def test_parse_snippet(self):
         code = """:> snippet say_hello (greeting name) 
          $(greeting) $(name)!
@@ -144,6 +157,28 @@ class ParserTest(unittest.TestCase):
 
         AstPrinter().print(ast)
 
+    def test_parse_text_parts(self):
+        code = "line 1\nHello $(person.name), $( greeting ) $(unclosed"
+
+        ast = Parser(self.scanner.scan(code)).parse()
+        parts = ast.statements[0].parts
+
+        self.assertEqual(6, len(parts))
+        self.assertEqual("line 1" + os.linesep + "Hello ", parts[0])
+        self.assertIsInstance(parts[1], QualifiedName)
+        self.assertEqual(2, parts[1].identifier_tokens[0].line_num)
+        self.assertEqual(", ", parts[2])
+        self.assertIsInstance(parts[3], Identifier)
+        self.assertEqual(" ", parts[4])
+        self.assertEqual("unclosed", parts[5])
+
+    def test_parse_invalid_text_expr(self):
+        # reported when parsing, even in a branch which is never rendered
+        code = ":> cond\n:> false\nHello $(person.)\n:> endcond"
+
+        with self.assertRaisesRegex(Exception, "Line 3: Invalid expression 'person.'"):
+            Parser(self.scanner.scan(code)).parse()
+
     def test_parse_file(self):
         file_path = os.path.dirname(__file__) + "/demo.schablonesk"
         code = self._read_file(file_path)
@@ -0,0 +1,57 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from schablonesk import CodeGenerator
+from schablonesk.profiler import Profiler
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def test_profile(self):
+        code_generator = CodeGenerator([os.path.dirname(__file__)])
+        template = code_generator.load("index.html.schablonesk")
+        params = {"title": "Hobbies", "hobbies": ["Hacking", "Running", "Reading"]}
+        profiler = Profiler()
+
+        output = template.profile(profiler, **params)
+
+        self.assertEqual(template.render(**params), output)
+        loop_stats = profiler.stats[("base.html.schablonesk", "ul", 7, "for")]
+        self.assertEqual(1, loop_stats.calls)
+        item_stats = profiler.stats[("base.html.schablonesk", "ul", 8, "text")]
+        self.assertEqual(3, item_stats.calls)
+        self.assertEqual(sum(len(f"    <li>{hobby}</li>") for hobby in params["hobbies"]), item_stats.output_bytes)
+        self.assertIn(("index.html.schablonesk", None, 11, "paste"), profiler.stats)
+        self.assertIn("base.html.schablonesk:ul:8 (text)", profiler.report())
+
+    def test_same_content(self):
+        # templates with the same content share the compiled template
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        for name in ["a.schablonesk", "b.schablonesk"]:
+            with open(os.path.join(tmp_dir, name), "w") as f:
+                f.write("$(v)")
+        code_generator = CodeGenerator([tmp_dir])
+        template_a = code_generator.load("a.schablonesk")
+        template_b = code_generator.load("b.schablonesk")
+        profiler = Profiler()
+
+        template_a.profile(profiler, v=1)
+
+        self.assertEqual("a.schablonesk", template_a.name)
+        self.assertEqual("b.schablonesk", template_b.name)
+        self.assertIn(("a.schablonesk", None, 1, "text"), profiler.stats)
+        self.assertNotIn(("b.schablonesk", None, 1, "text"), profiler.stats)
+
+    def test_collapsed_stacks(self):
+        profiler = Profiler()
+        code = ":> snippet s(v)\n$(v)\n:> endsnippet\n:> for i in items\n:> paste s(i)\n:> endfor"
+
+        CodeGenerator().compile(code).profile(profiler, items=[1, 2])
+        stacks = io.StringIO()
+        profiler.write_collapsed(stacks)
+
+        paths = [line.rsplit(" ", 1)[0] for line in stacks.getvalue().splitlines()]
+        self.assertIn("<template>:4 (for);<template>:5 (paste);<template>:s:2 (text)", paths)
@@ -71,6 +71,26 @@ class ScannerTest(unittest.TestCase):
         self.assertEqual(tokens[0].category, INT)
         self.print_tokens(tokens)
 
+    def test_scan_operators(self):
+        code = ":> a>=b<=c<>d<-e->f>g<h==i.j (1.5 23) 'x' ?rest"
+
+        tokens = self.scanner.scan(code)
+        categories = [token.category for token in tokens]
+        self.assertEqual([IDENTIFIER, GE, IDENTIFIER, LE, IDENTIFIER, NE,
+                          IDENTIFIER, LARROW, IDENTIFIER, RARROW, IDENTIFIER,
+                          GT, IDENTIFIER, LT, IDENTIFIER, EQ, IDENTIFIER, DOT,
+                          IDENTIFIER, LPAR, REAL, INT, RPAR, STRING, UNKNOWN],
+                         categories)
+        self.assertEqual("?rest", tokens[-1].lexeme)
+        self.print_tokens(tokens)
+
+    def test_scan_text_block(self):
+        code = "\n\nfirst\n\nsecond\n:> endfor"
+
+        tokens = self.scanner.scan(code)
+        self.assertEqual(2, len(tokens))
+        self.assertEqual("first" + os.linesep + os.linesep + "second", tokens[0].lexeme)
+
     @staticmethod
     def print_tokens(tokens):
         for token in tokens:
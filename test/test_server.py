@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+import time
+import unittest
+from schablonesk.server import RenderServer, recv_message, render_remote, send_message
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs Unix domain sockets")
+class RenderServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.work_dir, "render.sock")
+        self.server = RenderServer(self.socket_path, poll_interval=0.05)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.assertTrue(self.server.ready.wait(5))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        shutil.rmtree(self.work_dir)
+
+    def test_render(self):
+        template_file = self._write("list.schablonesk", ":> use s from 'lib.schablonesk'\n:> paste s(title)")
+        self._write("lib.schablonesk", ":> snippet s(t)\n<$(t)>\n:> endsnippet")
+        params_file = self._write("params.json", json.dumps({"title": "Hobbies"}))
+
+        output = render_remote(self.socket_path, {"template": template_file, "params_file": params_file})
+        self.assertEqual("<Hobbies>", output)
+
+        # imported templates are reloaded once the change has been polled
+        self._write("lib.schablonesk", ":> snippet s(t)\n[[$(t)]]\n:> endsnippet")
+        deadline = time.time() + 5
+        while render_remote(self.socket_path, {"template": template_file, "params_file": params_file}) != "[[Hobbies]]":
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+        output_file = os.path.join(self.work_dir, "out", "list.txt")
+        request = {"template": template_file, "params": {"title": "Books"}, "output": output_file}
+        self.assertIsNone(render_remote(self.socket_path, request))
+        with open(output_file, "r") as f:
+            self.assertEqual("[[Books]]\n", f.read())
+
+    def test_new_directory_keeps_changes(self):
+        server = RenderServer(os.path.join(self.work_dir, "other.sock"), poll_interval=60)
+        template_file = self._write("list.schablonesk", ":> use s from 'lib.schablonesk'\n:> paste s(title)")
+        self._write("lib.schablonesk", ":> snippet s(t)\n<$(t)>\n:> endsnippet")
+        os.mkdir(os.path.join(self.work_dir, "sub"))
+        other_file = self._write("sub/hello.schablonesk", "Hello $(title)!")
+        params = {"title": "Hobbies"}
+        self.assertEqual("<Hobbies>", server.render({"template": template_file, "params": params}))
+
+        # a template directory added before the next poll keeps the change
+        self._write("lib.schablonesk", ":> snippet s(t)\n[[$(t)]]\n:> endsnippet")
+        self.assertEqual("Hello Hobbies!", server.render({"template": other_file, "params": params}))
+        server.check_templates()
+
+        self.assertEqual("[[Hobbies]]", server.render({"template": template_file, "params": params}))
+
+    def test_errors(self):
+        template_file = self._write("dict.schablonesk", "$(person.name)")
+        params = {"person": {"name": "Ada"}}
+
+        with self.assertRaises(Exception):
+            render_remote(self.socket_path, {"template": template_file, "params": params})
+        with self.assertRaises(Exception):
+            render_remote(self.socket_path, {"params": params})
+        # pickle params could run code with the rights of the server
+        params_file = self._write("params.pkl", "")
+        with self.assertRaisesRegex(Exception, "not accepted"):
+            render_remote(self.socket_path, {"template": template_file, "params_file": params_file})
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(self.socket_path).st_mode))
+
+        # errors do not stop the server
+        output = render_remote(self.socket_path, {"template": template_file, "params": params, "dict_access": True})
+        self.assertEqual("Ada", output)
+
+    def test_several_requests_per_connection(self):
+        template_file = self._write("hello.schablonesk", "Hello $(name)!")
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.socket_path)
+            for name in ("Ada", "Kant"):
+                send_message(sock, {"template": template_file, "params": {"name": name}})
+                self.assertEqual({"ok": True, "output": f"Hello {name}!"}, recv_message(sock))
+
+    def _write(self, file_name, content):
+        path = os.path.join(self.work_dir, file_name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+
+if __name__ == "__main__":
+    unittest.main()
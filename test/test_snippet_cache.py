@@ -0,0 +1,89 @@
+import os
+import unittest
+
+from schablonesk.scanner import Scanner
+from schablonesk.parser import Parser
+from schablonesk.environment import Environment
+from schablonesk.interpreter import Interpreter
+from schablonesk.compiler import Compiler
+from schablonesk.snippet_cache import SnippetCache
+from schablonesk.template_exports import TemplateExports
+
+
+class SnippetCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scanner = Scanner()
+
+    def create_ast(self, code):
+        return Parser(self.scanner.scan(code)).parse()
+
+    def test_pure_snippet(self):
+        code = """:> snippet header (title level)
+<h$(level)>$(title)</h$(level)>
+        :> endsnippet
+        :> for number in numbers
+            :> paste header('Chapter' 1) indent by 2 spaces
+            :> paste header(number 2)
+        :> endfor"""
+        ast = self.create_ast(code)
+        global_env = Environment()
+        global_env.set_value("numbers", [1, 2, 1, 2])
+
+        expected = Interpreter(global_env).eval(ast)
+
+        snippet_cache = SnippetCache()
+        actual = Interpreter(global_env, snippet_cache=snippet_cache).eval(ast)
+        self.assertEqual(expected, actual)
+        self.assertEqual(5, snippet_cache.hits)
+        self.assertEqual(3, snippet_cache.misses)
+
+        snippet_cache = SnippetCache()
+        render = Compiler().compile(ast)
+        actual = render(global_env, TemplateExports([os.curdir]), snippet_cache)
+        self.assertEqual(expected, actual)
+        self.assertEqual(5, snippet_cache.hits)
+        self.assertEqual(3, snippet_cache.misses)
+
+    def test_impure_snippet(self):
+        code = """:> snippet name (person)
+$(person.name)
+        :> endsnippet
+        :> snippet counter ()
+            :> count <- next_count()
+$(count)
+        :> endsnippet"""
+        ast = self.create_ast(code)
+        snippet_cache = SnippetCache()
+
+        for snippet in ast.snippets:
+            self.assertFalse(snippet_cache.is_pure(snippet))
+            self.assertIsNone(snippet_cache.make_key(snippet, ["value"]))
+
+    def test_argument_types(self):
+        ast = self.create_ast(":> snippet show (value)\n$(value)\n:> endsnippet")
+        snippet = ast.snippets[0]
+        snippet_cache = SnippetCache()
+
+        self.assertNotEqual(snippet_cache.make_key(snippet, [1]),
+                            snippet_cache.make_key(snippet, [True]))
+        self.assertNotEqual(snippet_cache.make_key(snippet, [1]),
+                            snippet_cache.make_key(snippet, [1.0]))
+        self.assertIsNotNone(snippet_cache.make_key(snippet, [("a", 1)]))
+        self.assertIsNone(snippet_cache.make_key(snippet, [["a", 1]]))
+
+    def test_eviction(self):
+        ast = self.create_ast(":> snippet show (value)\n$(value)\n:> endsnippet")
+        snippet = ast.snippets[0]
+        snippet_cache = SnippetCache(max_size=2)
+
+        for value in ["a", "b", "c"]:
+            snippet_cache.put(snippet_cache.make_key(snippet, [value]), value)
+
+        self.assertEqual(2, len(snippet_cache))
+        self.assertIsNotNone(snippet_cache.get(snippet_cache.make_key(snippet, ["c"])))
+        self.assertEqual(1, snippet_cache.hits)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import unittest
+from schablonesk import CodeGenerator, TemplateIndex
+
+
+class TemplateIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.first_dir = os.path.join(self.tmp_dir, "first")
+        self.second_dir = os.path.join(self.tmp_dir, "second")
+        self._write(self.second_dir, "lib.schablonesk", ":> snippet greet(name)\nHello $(name)!\n:> endsnippet")
+        self._write(self.second_dir, "sub/other.schablonesk", "other")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_find(self):
+        index = TemplateIndex([self.first_dir, self.second_dir])
+
+        self.assertEqual(os.path.join(self.second_dir, "lib.schablonesk"), index.find("lib.schablonesk"))
+        self.assertEqual(os.path.join(self.second_dir, "sub", "other.schablonesk"),
+                         index.find("sub/other.schablonesk"))
+        self.assertIsNone(index.find("missing.schablonesk"))
+        # only requested directories are listed
+        self._write(self.second_dir, "unused/deep/x.schablonesk", "x")
+        self.assertEqual(["", "sub"], sorted(index._dirs))
+
+        self._write(self.first_dir, "lib.schablonesk", "shadowed")
+        self.assertEqual(os.path.join(self.second_dir, "lib.schablonesk"), index.find("lib.schablonesk"))
+        index.refresh()
+        self.assertEqual(os.path.join(self.first_dir, "lib.schablonesk"), index.find("lib.schablonesk"))
+
+    def test_shared_templates(self):
+        index = TemplateIndex([self.first_dir, self.second_dir])
+        code = ":> use greet from 'lib.schablonesk'\n:> paste greet('World')"
+        generators = [CodeGenerator([self.first_dir, self.second_dir], template_index=index) for _ in range(2)]
+
+        self.assertEqual("Hello World!", generators[0].generate_code(code))
+        exports = [code_generator.create_template_exports().get_exports("lib.schablonesk")
+                   for code_generator in generators]
+        self.assertIs(exports[0]["greet"], exports[1]["greet"])
+
+    def _write(self, dir_path, name, code):
+        path = os.path.join(dir_path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(code)
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+from schablonesk import CodeGenerator
+from schablonesk.batch import BatchJob, BatchRunner
+from schablonesk.watch import FileWatcher
+
+
+class WatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self._write("lib.schablonesk", ":> snippet greet(name)\nHello $(name)!\n:> endsnippet")
+        self._write("hello.schablonesk", ":> use greet from 'lib.schablonesk'\n:> paste greet(name)")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_poll(self):
+        watcher = FileWatcher([self.tmp_dir])
+
+        self.assertEqual(set(), watcher.poll())
+        self._write("lib.schablonesk", ":> snippet greet(name)\nHi $(name)!\n:> endsnippet")
+        self._write("sub/new.schablonesk", "new")
+        os.remove(os.path.join(self.tmp_dir, "hello.schablonesk"))
+
+        expected = set([os.path.join(self.tmp_dir, name)
+                        for name in ("lib.schablonesk", "sub/new.schablonesk", "hello.schablonesk")])
+        self.assertEqual(expected, watcher.poll())
+        self.assertEqual(set(), watcher.poll())
+
+    def test_set_paths(self):
+        other_dir = os.path.join(self.tmp_dir, "other")
+        self._write("other/new.schablonesk", "new")
+        watcher = FileWatcher([os.path.join(self.tmp_dir, "lib.schablonesk")])
+
+        # changes before adding a path are still reported by the next poll
+        self._write("lib.schablonesk", ":> snippet greet(name)\nHi $(name)!\n:> endsnippet")
+        watcher.set_paths([os.path.join(self.tmp_dir, "lib.schablonesk"), other_dir])
+
+        self.assertEqual(set([os.path.join(self.tmp_dir, "lib.schablonesk")]), watcher.poll())
+        self._write("other/new.schablonesk", "changed")
+        self.assertEqual(set([os.path.join(other_dir, "new.schablonesk")]), watcher.poll())
+
+    def test_invalidate(self):
+        code_generator = CodeGenerator([self.tmp_dir], share_exports=True)
+        code = ":> use greet from 'lib.schablonesk'\n:> paste greet('World')"
+        self.assertEqual("Hello World!", code_generator.generate_code(code))
+
+        self._write("lib.schablonesk", ":> snippet greet(name)\nHi $(name)!\n:> endsnippet")
+        self.assertEqual("Hello World!", code_generator.generate_code(code))
+
+        code_generator.invalidate([os.path.join(self.tmp_dir, "lib.schablonesk")])
+        self.assertEqual("Hi World!", code_generator.generate_code(code))
+
+    def test_batch_runner(self):
+        runner = BatchRunner(incremental=True)
+        jobs = [BatchJob(os.path.join(self.tmp_dir, "hello.schablonesk"), {"name": name},
+                         os.path.join(self.tmp_dir, f"out/{name}.txt"))
+                for name in ("World", "Erika")]
+
+        self.assertEqual(2, len(runner.run(jobs)))
+        self.assertEqual([], runner.run(jobs))
+
+        self._write("lib.schablonesk", ":> snippet greet(name)\nHi $(name)!\n:> endsnippet")
+        runner.invalidate([os.path.join(self.tmp_dir, "lib.schablonesk")])
+        self.assertEqual(2, len(runner.run(jobs)))
+        with open(os.path.join(self.tmp_dir, "out/Erika.txt"), "r") as f:
+            self.assertEqual("Hi Erika!\n", f.read())
+
+    def _write(self, name, code):
+        path = os.path.join(self.tmp_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(code)